@@ -0,0 +1,115 @@
+"""
+Opt-in semantic cache of chat answers (ANSWER_CACHE_ENABLED).
+
+A stored answer is reused when a new query from the same user embeds within
+ANSWER_CACHE_MAX_DISTANCE (cosine) of an earlier query and the user's data version is
+unchanged, so a new check-in always leads to a fresh generation. Conversation history is not
+part of the match: near-identical questions ("how was my sleep this week?") get the same answer.
+"""
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+
+from cache import TTLCache, get_data_version
+from config import settings
+from database import get_async_session_factory
+from embeddings import get_embedding
+
+
+@dataclass
+class AnswerLookup:
+    user_id: str
+    version: int
+    embedding: Optional[np.ndarray] = None
+    answer: Optional[str] = None
+
+
+class SemanticAnswerCache:
+    """Per (user, data version): up to per_user recent (time, unit query vector, answer) entries."""
+
+    def __init__(self, max_users: int, per_user: int, ttl: float, max_distance: float):
+        self._users = TTLCache(max_users, ttl=ttl)
+        self.per_user = per_user
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _fresh(self, entries: list, now: float) -> list:
+        return [e for e in entries if now - e[0] <= self.ttl]
+
+    def find(self, user_id: str, version: int, query: np.ndarray) -> Optional[str]:
+        now = time.monotonic()
+        best = None
+        for _, vec, answer in self._fresh(self._users.get((user_id, version)) or [], now):
+            distance = 1.0 - float(vec @ query)
+            if distance <= self.max_distance and (best is None or distance < best[0]):
+                best = (distance, answer)
+        with self._lock:
+            if best is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return best[1]
+
+    def add(self, user_id: str, version: int, query: np.ndarray, answer: str) -> None:
+        now = time.monotonic()
+        with self._lock:
+            entries = self._fresh(self._users.get((user_id, version)) or [], now)
+            entries = entries[-(self.per_user - 1):] if self.per_user > 1 else []
+            self._users.put((user_id, version), entries + [(now, query, answer)])
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "users": self._users.stats()["size"],
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0,
+            }
+
+
+_cache = SemanticAnswerCache(
+    settings.answer_cache_max_users,
+    settings.answer_cache_per_user,
+    settings.answer_cache_ttl,
+    settings.answer_cache_max_distance,
+)
+
+
+def answer_cache_stats() -> dict:
+    return {"enabled": settings.answer_cache_enabled, **_cache.stats()}
+
+
+def _unit(vec: List[float]) -> Optional[np.ndarray]:
+    v = np.asarray(vec, dtype=np.float32)
+    norm = float(np.linalg.norm(v))
+    return v / norm if norm else None
+
+
+async def lookup_answer(user_id: str, query: str) -> AnswerLookup:
+    """Cached answer for a near-identical earlier query, if any. Pass the result to remember_answer after generating."""
+    if not settings.answer_cache_enabled:
+        return AnswerLookup(user_id=user_id, version=0)
+    # Version first: an answer generated from this point on is only valid for data up to this version.
+    # Read from the shared data_versions table, so check-ins saved through any instance count.
+    async with get_async_session_factory()() as db:
+        result = AnswerLookup(user_id=user_id, version=await get_data_version(db, user_id))
+    # Same text and task type as the retrieval query, so this embedding is reused from the embedding cache
+    vec = await run_in_threadpool(get_embedding, query)
+    if vec:
+        result.embedding = _unit(vec)
+    if result.embedding is not None:
+        result.answer = _cache.find(user_id, result.version, result.embedding)
+    return result
+
+
+def remember_answer(lookup: AnswerLookup, answer: str) -> None:
+    if lookup.embedding is not None and answer.strip():
+        _cache.add(lookup.user_id, lookup.version, lookup.embedding, answer)
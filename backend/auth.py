@@ -1,40 +1,110 @@
-"""JWT and password hashing. get_current_user for protected routes."""
+"""JWT tokens. get_current_user for protected routes (password hashing is in passwords.py).
+
+Tokens carry the user's email and role as signed claims, and verified users are kept in a
+bounded TTL cache, so authenticated requests normally need no database query. After a change
+to a user, call invalidate_user (re-read the record, ignoring claims in older tokens) or
+revoke_user_tokens (force a new login). Cache and revocations are per process.
+"""
+import threading
+import time
+import uuid
 from datetime import datetime, timedelta
 from typing import Optional
 
 from fastapi import Depends, HTTPException
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jose import JWTError, jwt
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
 
+from cache import TTLCache
 from config import settings
-from database import User, get_db
+from database import User, get_async_session_factory
 from schemas import AuthUser
 
-pwd_ctx = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer(auto_error=False)
 
+_user_cache = TTLCache(settings.auth_cache_size, ttl=settings.auth_cache_ttl)
+_lock = threading.Lock()
+# jti -> exp of individually revoked tokens (pruned once expired)
+_revoked_tokens: dict[str, float] = {}
+# user_id -> time: tokens issued before it are rejected
+_revoked_before: dict[str, float] = {}
+# user_id -> time: claims in tokens issued before it are stale; the user is re-read from the database
+_claims_stale_before: dict[str, float] = {}
+
 
-def create_access_token(user_id: str) -> str:
+def create_access_token(user_id: str, email: Optional[str] = None, role: Optional[str] = None) -> str:
     expire = datetime.utcnow() + timedelta(minutes=settings.access_token_expire_minutes)
-    return jwt.encode({"sub": user_id, "exp": expire}, settings.secret_key, algorithm=settings.algorithm)
+    claims = {"sub": user_id, "exp": expire, "iat": int(time.time()), "jti": uuid.uuid4().hex}
+    if email is not None and role is not None:
+        claims.update(email=email, role=role)
+    return jwt.encode(claims, settings.secret_key, algorithm=settings.algorithm)
 
 
-def get_current_user(
-    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
-    db: Session = Depends(get_db),
-) -> AuthUser:
-    if not credentials or not credentials.credentials:
-        raise HTTPException(status_code=401, detail="Not authenticated")
+def decode_token(token: str) -> dict:
+    """Verified claims of a token, or 401 when it is invalid, expired or revoked."""
     try:
-        payload = jwt.decode(credentials.credentials, settings.secret_key, algorithms=[settings.algorithm])
-        user_id = payload.get("sub")
+        payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
+    user_id = payload.get("sub")
     if not user_id:
         raise HTTPException(status_code=401, detail="Invalid token")
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=401, detail="User not found")
-    return AuthUser(id=user.id, email=user.email, role=user.role)
+    issued = float(payload.get("iat") or 0)
+    if payload.get("jti") in _revoked_tokens or issued < _revoked_before.get(user_id, 0):
+        raise HTTPException(status_code=401, detail="Token has been revoked")
+    return payload
+
+
+def invalidate_user(user_id: str) -> None:
+    """Drop the cached record after a change to the user (e.g. role); the next request re-reads it."""
+    with _lock:
+        _claims_stale_before[user_id] = time.time()
+    _user_cache.pop(user_id)
+
+
+def revoke_token(payload: dict) -> None:
+    """Reject this token (by jti) from now until it expires."""
+    jti = payload.get("jti")
+    if not jti:
+        return
+    now = time.time()
+    with _lock:
+        for k in [k for k, exp in _revoked_tokens.items() if exp < now]:
+            del _revoked_tokens[k]
+        _revoked_tokens[jti] = float(payload.get("exp") or now)
+
+
+def revoke_user_tokens(user_id: str) -> None:
+    """Reject every token issued to the user so far (e.g. password change or account removal)."""
+    with _lock:
+        # iat has one-second resolution: tokens issued later in this same second stay valid
+        _revoked_before[user_id] = float(int(time.time()))
+    invalidate_user(user_id)
+
+
+def auth_cache_stats() -> dict:
+    return {**_user_cache.stats(), "revoked_tokens": len(_revoked_tokens)}
+
+
+async def get_current_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+) -> AuthUser:
+    if not credentials or not credentials.credentials:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    payload = decode_token(credentials.credentials)
+    user_id = payload["sub"]
+    user = _user_cache.get(user_id)
+    if user is not None:
+        return user
+    if payload.get("email") and payload.get("role") and float(payload.get("iat") or 0) >= _claims_stale_before.get(user_id, 0):
+        user = AuthUser(id=user_id, email=payload["email"], role=payload["role"])
+    else:
+        # Older token without claims (or claims predating invalidate_user): read the record once.
+        # Own short-lived session: the connection goes back to the pool before the route runs
+        async with get_async_session_factory()() as db:
+            row = await db.get(User, user_id)
+        if not row:
+            raise HTTPException(status_code=401, detail="User not found")
+        user = AuthUser(id=row.id, email=row.email, role=row.role)
+    _user_cache.put(user_id, user)
+    return user
@@ -0,0 +1,155 @@
+"""
+Synthetic patients and check-ins for load tests, bulk-loaded with COPY.
+
+Creates users/patients bench-u-00000000.. (email bench0@bench.local.., password BENCH_PASSWORD,
+one bcrypt hash shared by all) and check-ins spread one per day backwards from today, with
+scores stored by scores.score_arrays (the app's own rules, current SCORE_VERSION). All ids
+start with "bench-", so --reset removes exactly what an earlier run (and the load tests) created.
+
+Run from backend/ against a local Postgres with pgvector (uses DATABASE_URL):
+
+    python -m benchmarks.datagen --patients 5000 --check-ins 2000000
+    python -m benchmarks.datagen --reset --patients 0
+"""
+import argparse
+import io
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from sqlalchemy import text
+
+from cache import bump_data_versions
+from database import get_engine
+from passwords import pwd_ctx
+from scores import SCORE_VERSION, SYMPTOM_KEYS, score_arrays
+from startup import ensure_schema
+
+BENCH_PASSWORD = "bench-password"
+CHUNK = 100_000
+CHECK_IN_COLUMNS = (
+    "id", "patient_id", "date", *SYMPTOM_KEYS, "sleep_hours", "meds_taken", "appetite", "mobility",
+    "devices", "notes", "symptom_score", "risk_score", "status", "score_version",
+)
+CONDITIONS = ("COPD", "Heart failure", "Diabetes", "Asthma", "Hypertension", "Post-surgery")
+NOTES = ("Felt tired after walking", "Slept badly", "Better than yesterday", "Short of breath on stairs")
+
+
+def user_id(n: int) -> str:
+    return f"bench-u-{n:08d}"
+
+
+def bench_email(n: int) -> str:
+    return f"bench{n}@bench.local"
+
+
+def _copy(raw, table: str, columns, buf: io.StringIO) -> None:
+    buf.seek(0)
+    raw.cursor().copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buf)
+
+
+def reset(engine) -> None:
+    """Delete everything owned by bench users (their check-ins, chats, patients and users)."""
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM chat_messages WHERE conversation_id IN (SELECT id FROM conversations WHERE user_id LIKE 'bench-u-%')"))
+        conn.execute(text("DELETE FROM conversations WHERE user_id LIKE 'bench-u-%'"))
+        conn.execute(text("DELETE FROM check_ins WHERE patient_id LIKE 'bench-u-%'"))
+        conn.execute(text("DELETE FROM patients WHERE id LIKE 'bench-u-%'"))
+        conn.execute(text("DELETE FROM users WHERE id LIKE 'bench-u-%'"))
+        # COPY/DELETE bypass the app: make cached list responses (ETags) revalidate
+        bump_data_versions(conn, [])
+
+
+def load_users(raw, rng, patients: int) -> None:
+    hashed = pwd_ctx.hash(BENCH_PASSWORD)
+    now = datetime.now(timezone.utc).isoformat()
+    users, pats = io.StringIO(), io.StringIO()
+    ages = rng.integers(25, 90, size=patients)
+    conditions = rng.integers(0, len(CONDITIONS), size=patients)
+    for n in range(patients):
+        users.write(f"{user_id(n)},{bench_email(n)},{hashed},patient,{now}\n")
+        pats.write(f"{user_id(n)},Bench Patient {n},{ages[n]},{CONDITIONS[conditions[n]]},{now}\n")
+    _copy(raw, "users", ("id", "email", "hashed_password", "role", "created_at"), users)
+    _copy(raw, "patients", ("id", "name", "age", "condition", "created_at"), pats)
+
+
+def check_in_chunk(rng, start: int, n: int, patients: int, today: datetime) -> io.StringIO:
+    """CSV for check-ins start..start+n: check-in i belongs to patient i % patients, day i // patients back."""
+    idx = np.arange(start, start + n)
+    patient = idx % patients
+    days_back = idx // patients
+    # Mostly mild symptoms with occasional flare-ups
+    symptoms = np.minimum(10, rng.exponential(1.8, size=(n, len(SYMPTOM_KEYS))).astype(np.int64)).astype(np.float64)
+    sleep = np.round(rng.normal(6.8, 1.4, size=n).clip(2, 12), 1)
+    meds = rng.random(n) > 0.1
+    symptom, risk, status = score_arrays(symptoms, meds, sleep)
+    appetite = np.where(rng.random(n) < 0.85, "Normal", np.where(rng.random(n) < 0.5, "Reduced", "Increased"))
+    mobility = np.where(rng.random(n) < 0.9, "Normal", "Reduced")
+    spo2 = rng.integers(88, 100, size=n)
+    heart = rng.integers(55, 115, size=n)
+    has_devices = rng.random(n) < 0.3
+    note = rng.integers(-8, len(NOTES), size=n)  # negative: no note (most rows)
+    hours = rng.integers(6, 22, size=n)
+
+    buf = io.StringIO()
+    sym_rows = symptoms.astype(np.int64).tolist()
+    for j in range(n):
+        date = (today - timedelta(days=int(days_back[j]), hours=-int(hours[j]))).isoformat()
+        devices = f'"{{""spo2"": {spo2[j]}, ""heart_rate"": {heart[j]}}}"' if has_devices[j] else ""
+        notes = NOTES[note[j]] if note[j] >= 0 else ""
+        buf.write(
+            f"bench-c-{idx[j]:012d},{user_id(int(patient[j]))},{date},"
+            + ",".join(map(str, sym_rows[j]))
+            + f",{sleep[j]},{'t' if meds[j] else 'f'},{appetite[j]},{mobility[j]},{devices},{notes},"
+            f"{symptom[j]},{risk[j]},{status[j]},{SCORE_VERSION}\n"
+        )
+    return buf
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--patients", type=int, default=5000)
+    parser.add_argument("--check-ins", type=int, default=2_000_000)
+    parser.add_argument("--reset", action="store_true", help="Delete earlier bench data first")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    engine = get_engine()
+    ensure_schema(engine)
+    if args.reset:
+        t0 = time.perf_counter()
+        reset(engine)
+        print(f"reset: {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+    if args.patients <= 0:
+        return
+    rng = np.random.default_rng(args.seed)
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    raw = engine.raw_connection()
+    try:
+        t0 = time.perf_counter()
+        load_users(raw, rng, args.patients)
+        raw.commit()
+        for start in range(0, args.check_ins, CHUNK):
+            n = min(CHUNK, args.check_ins - start)
+            _copy(raw, "check_ins", CHECK_IN_COLUMNS, check_in_chunk(rng, start, n, args.patients, today))
+            raw.commit()
+            rate = (start + n) / (time.perf_counter() - t0)
+            print(f"\rcheck-ins {start + n}/{args.check_ins} ({rate:,.0f} rows/s)", end="", file=sys.stderr)
+        print(file=sys.stderr)
+        cur = raw.cursor()
+        for table in ("users", "patients", "check_ins"):
+            cur.execute(f"ANALYZE {table}")
+        raw.commit()
+        with engine.begin() as conn:
+            bump_data_versions(conn, [])
+    finally:
+        raw.close()
+    print(
+        f"Loaded {args.patients} patients and {args.check_ins} check-ins in {time.perf_counter() - t0:.1f}s "
+        f"(login: {bench_email(0)} / {BENCH_PASSWORD})"
+    )
+
+
+if __name__ == "__main__":
+    main()
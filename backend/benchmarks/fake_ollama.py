@@ -0,0 +1,115 @@
+"""
+Stand-in for the Ollama HTTP API, for offline load tests (standard library only).
+
+Serves the endpoints the app uses: POST /api/chat (streaming NDJSON or a single JSON reply)
+and POST /api/embed (deterministic feature-hashing vectors, as EMBEDDING_PROVIDER=hashing).
+Generation time is simulated: a first-token delay plus a per-token delay.
+
+    python -m benchmarks.fake_ollama --port 11435 --first-token-ms 200 --token-ms 15
+    OLLAMA_BASE_URL=http://127.0.0.1:11435 uvicorn main:app
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from embeddings import HashingEmbeddingBackend
+
+ANSWER = (
+    "Based on your recent check-ins, your fatigue has eased slightly while your sleep stayed "
+    "around six hours. Keep taking your medication as prescribed and mention the dizziness to "
+    "your care team at the next visit."
+)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "FakeOllama"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _json(self, status: int, body: dict) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _chunk(self, body: dict) -> None:
+        line = (json.dumps(body) + "\n").encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            return self._json(200, {"models": [{"name": self.server.model}]})
+        self._json(404, {"error": "not found"})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        if self.path == "/api/embed":
+            texts = body.get("input") or []
+            texts = [texts] if isinstance(texts, str) else texts
+            time.sleep(self.server.embed_ms / 1000)
+            return self._json(200, {"model": body.get("model"), "embeddings": [HashingEmbeddingBackend._one(t) for t in texts]})
+        if self.path != "/api/chat":
+            return self._json(404, {"error": "not found"})
+        tokens = [w + " " for w in ANSWER.split()][: self.server.max_tokens]
+        time.sleep(self.server.first_token_ms / 1000)
+        if body.get("stream") is False:
+            time.sleep(self.server.token_ms * len(tokens) / 1000)
+            return self._json(200, {"message": {"role": "assistant", "content": "".join(tokens).strip()}, "done": True})
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, token in enumerate(tokens):
+            if i:
+                time.sleep(self.server.token_ms / 1000)
+            self._chunk({"message": {"role": "assistant", "content": token}, "done": False})
+        self._chunk({"message": {"role": "assistant", "content": ""}, "done": True})
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class FakeOllama(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, first_token_ms: float = 200, token_ms: float = 15,
+                 embed_ms: float = 5, max_tokens: int = 64, model: str = "llama3.2"):
+        super().__init__((host, port), _Handler)
+        self.first_token_ms = first_token_ms
+        self.token_ms = token_ms
+        self.embed_ms = embed_ms
+        self.max_tokens = max_tokens
+        self.model = model
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeOllama":
+        """Serve from a daemon thread (port 0 picks a free port; see .url)."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--first-token-ms", type=float, default=200)
+    parser.add_argument("--token-ms", type=float, default=15)
+    parser.add_argument("--embed-ms", type=float, default=5)
+    parser.add_argument("--max-tokens", type=int, default=64)
+    args = parser.parse_args()
+    server = FakeOllama(args.host, args.port, args.first_token_ms, args.token_ms, args.embed_ms, args.max_tokens)
+    print(f"Fake Ollama on {server.url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
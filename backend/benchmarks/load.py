@@ -0,0 +1,210 @@
+"""
+End-to-end load generator for the API: throughput and p50/p95/p99 latency per scenario.
+
+Scenarios (run one after another, each for --duration seconds at --concurrency):
+- login:        POST /auth/login as the bench users (bcrypt verify)
+- check-ins:    GET /check-ins?patient_id=..&limit=.. (newest page of one patient)
+- check-in-add: POST /check-ins
+- chat:         POST /chat (RAG context + generation)
+- chat-stream:  POST /chat/stream, timed to the end of the stream (time to first token reported too)
+
+With --spawn (default) everything runs offline: a stand-in Ollama (benchmarks.fake_ollama) on a
+free port and the app under uvicorn with LLM_PROVIDER=ollama pointed at it and the hashing
+embedder, using DATABASE_URL (local Postgres with pgvector). Load data first with
+benchmarks.datagen; missing bench users are registered by their first login.
+
+    python -m benchmarks.datagen --patients 5000 --check-ins 2000000
+    python -m benchmarks.load --scenarios all --concurrency 32 --duration 20 --out load.json
+    python -m benchmarks.load --url http://127.0.0.1:8000/api --scenarios check-ins --compare load.json
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.datagen import BENCH_PASSWORD, bench_email
+from benchmarks.fake_ollama import FakeOllama
+from benchmarks.report import add_output_args, finish, summarize
+
+SCENARIOS = ("login", "check-ins", "check-in-add", "chat", "chat-stream")
+QUESTIONS = (
+    "How has my sleep been this week?",
+    "Is my fatigue getting better?",
+    "Summarise my last few check-ins.",
+    "Did I miss any medication recently?",
+    "What symptoms should I mention to my doctor?",
+)
+
+
+class Session:
+    """A logged-in bench user."""
+
+    def __init__(self, email: str, user_id: str, token: str):
+        self.email = email
+        self.user_id = user_id
+        self.headers = {"Authorization": f"Bearer {token}"}
+
+
+async def login_users(client: httpx.AsyncClient, count: int) -> List[Session]:
+    async def one(n: int) -> Session:
+        r = await client.post("/auth/login", json={"email": bench_email(n), "password": BENCH_PASSWORD})
+        r.raise_for_status()
+        data = r.json()
+        return Session(data["user"]["email"], data["user"]["id"], data["token"]["access_token"])
+
+    sessions = []
+    # A few at a time: logins share the server's bcrypt pool
+    for start in range(0, count, 8):
+        sessions += await asyncio.gather(*(one(n) for n in range(start, min(count, start + 8))))
+    return sessions
+
+
+async def _request(client: httpx.AsyncClient, scenario: str, s: Session, i: int, args, first_token: List[float]) -> int:
+    if scenario == "login":
+        r = await client.post("/auth/login", json={"email": s.email, "password": BENCH_PASSWORD})
+    elif scenario == "check-ins":
+        r = await client.get("/check-ins", params={"patient_id": s.user_id, "limit": args.page_size}, headers=s.headers)
+    elif scenario == "check-in-add":
+        body = {
+            "patient_id": s.user_id,
+            "date": datetime.now(timezone.utc).isoformat(),
+            "fatigue": i % 7, "cough": i % 3, "sleep_hours": 5 + i % 4, "meds_taken": i % 10 != 0,
+        }
+        r = await client.post("/check-ins", json=body, headers=s.headers)
+    elif scenario == "chat":
+        r = await client.post("/chat", json={"message": QUESTIONS[i % len(QUESTIONS)]}, headers=s.headers)
+    else:
+        t0 = time.perf_counter()
+        async with client.stream("POST", "/chat/stream", json={"message": QUESTIONS[i % len(QUESTIONS)]}, headers=s.headers) as r:
+            seen_token = False
+            async for line in r.aiter_lines():
+                if not seen_token and line.startswith("event: token"):
+                    first_token.append(time.perf_counter() - t0)
+                    seen_token = True
+    return r.status_code
+
+
+async def run_scenario(client: httpx.AsyncClient, scenario: str, sessions: List[Session], args) -> dict:
+    latencies: List[float] = []
+    first_token: List[float] = []
+    statuses: Counter = Counter()
+    counter = itertools.count()
+    deadline = time.perf_counter() + args.duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            i = next(counter)
+            t0 = time.perf_counter()
+            try:
+                code = await _request(client, scenario, sessions[i % len(sessions)], i, args, first_token)
+            except httpx.HTTPError as e:
+                code = type(e).__name__
+            latencies.append(time.perf_counter() - t0)
+            statuses[code] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    errors = sum(n for code, n in statuses.items() if not (isinstance(code, int) and code < 400))
+    extra = {"statuses": {str(k): v for k, v in sorted(statuses.items(), key=str)}}
+    if first_token:
+        extra["first_token_p50_ms"] = round(sorted(first_token)[len(first_token) // 2] * 1000, 3)
+    return summarize(latencies, elapsed, errors, **extra)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def spawn_server(args, ollama_url: str) -> subprocess.Popen:
+    port = _free_port()
+    env = {
+        **os.environ,
+        "LLM_PROVIDER": "ollama",
+        "OLLAMA_BASE_URL": ollama_url,
+        "EMBEDDING_PROVIDER": args.embedder,
+        # Bench users log in far more often than LOGIN_MAX_ATTEMPTS allows real ones to fail
+        "LOGIN_MAX_ATTEMPTS": "1000000",
+    }
+    cmd = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--workers", str(args.workers), "--log-level", "warning"]
+    proc = subprocess.Popen(cmd, env=env, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    args.url = f"http://127.0.0.1:{port}/api"
+    return proc
+
+
+async def wait_ready(base_url: str, timeout: float = 120) -> None:
+    root = base_url.rsplit("/api", 1)[0]
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as c:
+        while time.monotonic() < deadline:
+            try:
+                if (await c.get(f"{root}/ready")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.25)
+    raise RuntimeError(f"Server at {root} not ready after {timeout}s")
+
+
+async def run(args) -> Dict[str, dict]:
+    await wait_ready(args.url)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        sessions = await login_users(client, args.users)
+        results = {}
+        for scenario in args.scenarios:
+            print(f"{scenario}: {args.duration}s at concurrency {args.concurrency}...", file=sys.stderr)
+            results[scenario] = await run_scenario(client, scenario, sessions, args)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default="login,check-ins,check-in-add,chat", help=f"Comma-separated: {', '.join(SCENARIOS)} or all")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=15, help="Seconds per scenario")
+    parser.add_argument("--users", type=int, default=50, help="Bench users to log in as (bench0..)")
+    parser.add_argument("--page-size", type=int, default=100, help="limit for GET /check-ins")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--url", help="API base URL of a running server (e.g. http://127.0.0.1:8000/api); default: spawn one")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the spawned server")
+    parser.add_argument("--embedder", default="hashing", choices=["hashing", "ollama", "none"], help="EMBEDDING_PROVIDER for the spawned server (ollama = the stand-in's /api/embed)")
+    parser.add_argument("--first-token-ms", type=float, default=200, help="Stand-in Ollama: delay before the first token")
+    parser.add_argument("--token-ms", type=float, default=15, help="Stand-in Ollama: delay per further token")
+    add_output_args(parser)
+    args = parser.parse_args()
+    args.scenarios = list(SCENARIOS) if args.scenarios == "all" else [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    fake: Optional[FakeOllama] = None
+    proc: Optional[subprocess.Popen] = None
+    if not args.url:
+        fake = FakeOllama(first_token_ms=args.first_token_ms, token_ms=args.token_ms).start()
+        proc = spawn_server(args, fake.url)
+    try:
+        results = asyncio.run(run(args))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=30)
+        if fake is not None:
+            fake.shutdown()
+    params = {k: getattr(args, k) for k in ("scenarios", "concurrency", "duration", "users", "page_size", "workers", "embedder", "first_token_ms", "token_ms")}
+    finish(args, "load", f"API load ({args.concurrency} concurrent, {args.duration:g}s per scenario)", results, params)
+
+
+if __name__ == "__main__":
+    main()
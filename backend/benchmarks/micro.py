@@ -0,0 +1,137 @@
+"""
+Micro-benchmarks of check-in scoring and list serialization (no database or server needed).
+
+Builds synthetic CheckIn rows in memory and times score_batch against per-row scoring,
+scores.check_in_to_response per row, the batch check_ins_to_response, and the JSON encoding
+done by GET /check-ins: the earlier response-model path, the direct (orjson) path and
+format=columnar for a chart's fields.
+Rows come in two flavours: "stored" (current score_version, scores read from the row) and
+"stale" (scores computed on read). Before timing, the per-row and batch scorers are checked
+to give identical results.
+
+    python -m benchmarks.micro --rows 1000 --out micro.json
+    python -m benchmarks.micro --compare micro.json
+"""
+import argparse
+import json
+import random
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from pydantic import TypeAdapter
+
+from benchmarks.report import add_output_args, finish, summarize, timings
+from database import CheckIn
+from schemas import CheckInWithScoresOut
+from scores import SCORE_VERSION, SYMPTOM_KEYS, apply_scores, check_in_to_response, check_ins_to_columns, check_ins_to_response, score_batch
+from scores import _risk_score, _status, _symptom_score
+
+try:
+    from orjson import dumps as _dumps
+except ImportError:  # GET /check-ins falls back to the standard library too
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+CHART_FIELDS = ("date", "symptom_score")
+
+
+def make_rows(n: int, stored: bool, seed: int = 42) -> List[CheckIn]:
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    rows = []
+    for i in range(n):
+        row = CheckIn(
+            id=f"bench-c-{i:012d}",
+            patient_id=f"bench-u-{i % 50:08d}",
+            date=start + timedelta(hours=6 * i),
+            **{k: float(min(10, int(rng.expovariate(0.5)))) for k in SYMPTOM_KEYS},
+            sleep_hours=round(rng.uniform(3, 10), 1),
+            meds_taken=rng.random() > 0.1,
+            appetite=rng.choice(["Normal", "Normal", "Normal", "Reduced", "Increased"]),
+            mobility=rng.choice(["Normal", "Normal", "Reduced"]),
+            devices=json.dumps({"spo2": rng.randint(90, 99), "heart_rate": rng.randint(55, 110)}) if rng.random() < 0.3 else None,
+            notes="Felt tired after the walk, slept badly." if rng.random() < 0.2 else None,
+        )
+        if stored:
+            apply_scores(row)
+        else:
+            row.score_version = SCORE_VERSION - 1
+        rows.append(row)
+    return rows
+
+
+def per_row_scores(row: CheckIn) -> tuple:
+    """What score_batch computes, one row at a time with the per-row rules."""
+    risk = _risk_score(row)
+    return _symptom_score(row), risk, _status(risk)
+
+
+def check_parity(rows: List[CheckIn]) -> None:
+    """Batch (vectorized) and per-row scoring must agree exactly; exits non-zero when they do not."""
+    batch = check_ins_to_response(rows)
+    single = [check_in_to_response(r) for r in rows]
+    bad = [a["id"] for a, b in zip(batch, single) if a != b]
+    if bad:
+        print(f"Score parity FAILED for {len(bad)} of {len(rows)} rows, e.g. {bad[:5]}", file=sys.stderr)
+        sys.exit(1)
+    print(f"Score parity OK ({len(rows)} rows)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000, help="Rows per list (GET /check-ins returns up to 1000 per page)")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed rounds per case")
+    parser.add_argument("--seed", type=int, default=42)
+    add_output_args(parser)
+    args = parser.parse_args()
+
+    stored = make_rows(args.rows, stored=True, seed=args.seed)
+    stale = make_rows(args.rows, stored=False, seed=args.seed)
+    check_parity(stale)
+
+    adapter = TypeAdapter(List[CheckInWithScoresOut])
+    stored_dicts = check_ins_to_response(stored)
+    models = [CheckInWithScoresOut(**d) for d in stored_dicts]
+    n = args.rows
+    cases = {
+        "row: check_in_to_response (stored)": (lambda: check_in_to_response(stored[0]), 1000),
+        "row: check_in_to_response (stale)": (lambda: check_in_to_response(stale[0]), 1000),
+        f"list[{n}]: per-row scoring only": (lambda: [per_row_scores(r) for r in stale], 1),
+        f"list[{n}]: score_batch": (lambda: score_batch(stale), 1),
+        f"list[{n}]: per-row check_in_to_response (stale)": (lambda: [check_in_to_response(r) for r in stale], 1),
+        f"list[{n}]: check_ins_to_response (stored)": (lambda: check_ins_to_response(stored), 1),
+        f"list[{n}]: check_ins_to_response (stale)": (lambda: check_ins_to_response(stale), 1),
+        f"list[{n}]: CheckInWithScoresOut(**d)": (lambda: [CheckInWithScoresOut(**d) for d in stored_dicts], 1),
+        f"list[{n}]: response JSON (pydantic)": (lambda: adapter.dump_json(models), 1),
+        f"list[{n}]: json.dumps(dicts)": (lambda: json.dumps(stored_dicts), 1),
+        f"list[{n}]: full GET /check-ins path, validated (stale)": (
+            lambda: adapter.dump_json([CheckInWithScoresOut(**d) for d in check_ins_to_response(stale)]),
+            1,
+        ),
+        f"list[{n}]: full GET /check-ins path, direct (stale)": (lambda: _dumps(check_ins_to_response(stale)), 1),
+        f"list[{n}]: full GET /check-ins columnar date,symptom_score (stale)": (
+            lambda: _dumps(check_ins_to_columns(stale, CHART_FIELDS)),
+            1,
+        ),
+    }
+    results = {}
+    for name, (fn, number) in cases.items():
+        fn()  # warm caches / lazy imports
+        lat = timings(fn, args.repeat, number)
+        rows_per_call = n if name.startswith("list") else 1
+        extra = {"rows_per_sec": round(rows_per_call / (sum(lat) / len(lat)))}
+        if name.startswith(f"list[{n}]: full"):
+            extra["bytes"] = len(fn())
+        results[name] = summarize(lat, sum(lat), **extra)
+    finish(
+        args,
+        "micro",
+        f"Check-in scoring and serialization ({args.repeat} rounds; per_sec = calls/s)",
+        results,
+        {"rows": n, "repeat": args.repeat, "seed": args.seed},
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Result summaries shared by the benchmarks: latency percentiles, throughput, a printed table and
+JSON files that can be compared between commits.
+
+    python -m benchmarks.micro --out before.json
+    (change code)
+    python -m benchmarks.micro --compare before.json
+"""
+import json
+import platform
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional, Sequence
+
+# Columns printed by print_table, in order
+COLUMNS = ("count", "errors", "per_sec", "mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms")
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Nearest-rank percentile (q in 0..100) of values."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def summarize(latencies: Sequence[float], elapsed: float, errors: int = 0, **extra) -> dict:
+    """Latencies in seconds -> count, throughput over elapsed seconds, mean/p50/p95/p99/max in ms."""
+    ms = [x * 1000 for x in latencies]
+    return {
+        "count": len(ms),
+        "errors": errors,
+        "per_sec": round(len(ms) / elapsed, 1) if elapsed > 0 else 0.0,
+        "mean_ms": round(sum(ms) / len(ms), 3) if ms else 0.0,
+        "p50_ms": round(percentile(ms, 50), 3),
+        "p95_ms": round(percentile(ms, 95), 3),
+        "p99_ms": round(percentile(ms, 99), 3),
+        "max_ms": round(max(ms), 3) if ms else 0.0,
+        **extra,
+    }
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def print_table(title: str, results: Dict[str, dict], baseline: Optional[Dict[str, dict]] = None) -> None:
+    """One row per case; with baseline, p50/p99/per_sec also show the change in percent."""
+    print(f"\n{title}")
+    width = max([len(n) for n in results] + [4])
+    print(f"{'case':<{width}}  " + "  ".join(f"{c:>10}" for c in COLUMNS))
+    for name, row in results.items():
+        cells = []
+        for c in COLUMNS:
+            value = row.get(c, "")
+            cell = f"{value:>10}"
+            old = (baseline or {}).get(name, {}).get(c)
+            if old and c in ("per_sec", "p50_ms", "p99_ms") and isinstance(value, (int, float)):
+                cell += f" ({(value - old) / old * 100:+.0f}%)"
+            cells.append(cell)
+        print(f"{name:<{width}}  " + "  ".join(cells))
+
+
+def load_results(path: str) -> Dict[str, dict]:
+    with open(path) as f:
+        return json.load(f)["results"]
+
+
+def save_results(path: str, suite: str, results: Dict[str, dict], params: Optional[dict] = None) -> None:
+    """Write results with the git revision, Python version and parameters, for later --compare."""
+    doc = {
+        "suite": suite,
+        "revision": _git_revision(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version.split()[0],
+        "machine": platform.platform(),
+        "params": params or {},
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(doc, f, indent=2)
+    print(f"\nSaved {path} (revision {doc['revision'] or 'unknown'})")
+
+
+def add_output_args(parser) -> None:
+    parser.add_argument("--out", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Results JSON from an earlier run (e.g. the previous commit) to show changes against")
+
+
+def finish(args, suite: str, title: str, results: Dict[str, dict], params: Optional[dict] = None) -> None:
+    """Print the table (against --compare if given) and write --out."""
+    print_table(title, results, load_results(args.compare) if args.compare else None)
+    if args.out:
+        save_results(args.out, suite, results, params)
+
+
+def timings(fn, repeat: int, number: int) -> List[float]:
+    """Seconds per call of fn over repeat rounds of number calls each (like timeit.repeat, per call)."""
+    out = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        out.append((time.perf_counter() - t0) / number)
+    return out
@@ -0,0 +1,175 @@
+"""
+Recall and latency of per-user ANN search over chat message embeddings.
+
+Loads synthetic 768-dim embeddings into a scratch table (bench_chat_messages, same shape and
+indexes as chat_messages), builds the index the app would build (vector_index.index_sql), then
+runs the same filtered query as RAGChat.retrieve_context for random users, comparing against exact
+nearest neighbours computed in NumPy.
+
+Run from backend/ against a local Postgres with pgvector (uses DATABASE_URL):
+
+    python -m benchmarks.vector_search --messages 1000000 --users 2000
+    python -m benchmarks.vector_search --kind ivfflat --probes 1,10,40
+"""
+import argparse
+import io
+import statistics
+import struct
+import sys
+import time
+
+import numpy as np
+from sqlalchemy import text
+
+from benchmarks.report import percentile
+from config import settings
+from database import get_engine
+from vector_index import _parse_version, _settings_for, ensure_vector_index
+
+DIM = 768
+TABLE = "bench_chat_messages"
+INDEX = "ix_bench_chat_messages_embedding"
+CHUNK = 20_000
+
+# Binary COPY row: field count, bigint id, char(8) user_id, vector (dim, unused, float4[dim]); all big-endian
+_ROW = np.dtype([
+    ("nfields", ">i2"),
+    ("id_len", ">i4"), ("id", ">i8"),
+    ("uid_len", ">i4"), ("uid", "S8"),
+    ("vec_len", ">i4"), ("dim", ">i2"), ("unused", ">i2"), ("vec", ">f4", DIM),
+])
+
+
+def _user_id(n: int) -> bytes:
+    return b"u%07d" % n
+
+
+def _unit(m: np.ndarray) -> np.ndarray:
+    return m / np.linalg.norm(m, axis=1, keepdims=True)
+
+
+def load(engine, rng, args, query_users: set) -> dict:
+    """Create and fill the scratch table. Returns {user index: (ids, vectors, topic centres)} for query_users."""
+    topics = _unit(rng.standard_normal((args.topics, DIM)).astype(np.float32))
+    user_topics = rng.integers(0, args.topics, size=(args.users, args.topics_per_user))
+    kept = {u: ([], []) for u in query_users}
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+        conn.execute(text(f"CREATE TABLE {TABLE} (id BIGINT PRIMARY KEY, user_id VARCHAR(36) NOT NULL, embedding vector({DIM}))"))
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        for start in range(0, args.messages, CHUNK):
+            n = min(CHUNK, args.messages - start)
+            users = rng.integers(0, args.users, size=n)
+            picks = user_topics[users, rng.integers(0, args.topics_per_user, size=n)]
+            vecs = _unit(topics[picks] + args.noise * rng.standard_normal((n, DIM)).astype(np.float32))
+            rows = np.zeros(n, dtype=_ROW)
+            rows["nfields"], rows["id_len"], rows["uid_len"] = 3, 8, 8
+            rows["id"] = np.arange(start, start + n)
+            rows["uid"] = [_user_id(u) for u in users]
+            rows["vec_len"], rows["dim"] = 4 + 4 * DIM, DIM
+            rows["vec"] = vecs
+            buf = io.BytesIO()
+            buf.write(b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0))
+            buf.write(rows.tobytes())
+            buf.write(struct.pack(">h", -1))
+            buf.seek(0)
+            cur.copy_expert(f"COPY {TABLE} (id, user_id, embedding) FROM STDIN WITH (FORMAT binary)", buf)
+            for i in np.flatnonzero(np.isin(users, list(query_users))):
+                kept[int(users[i])][0].append(start + int(i))
+                kept[int(users[i])][1].append(vecs[i])
+            print(f"\rloaded {start + n}/{args.messages}", end="", file=sys.stderr)
+        raw.commit()
+    finally:
+        raw.close()
+    print(file=sys.stderr)
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE INDEX ix_{TABLE}_user_id ON {TABLE} (user_id)"))
+    # Query vectors come from each user's own topics, like a question about their past chats
+    return {u: (np.array(ids), np.array(v), topics[user_topics[u]]) for u, (ids, v) in kept.items()}
+
+
+def run_queries(engine, queries, k: int, session_sql) -> tuple[list, list]:
+    sql = text(
+        f"SELECT id FROM (SELECT id, embedding <=> CAST(:q AS vector) AS distance FROM {TABLE} "
+        "WHERE user_id = :u ORDER BY distance LIMIT :k) AS c ORDER BY distance"
+    )
+    latencies, recalls = [], []
+    with engine.connect() as conn:
+        for uid, qvec, truth in queries:
+            with conn.begin():
+                for stmt in session_sql:
+                    conn.execute(text(stmt))
+                t0 = time.perf_counter()
+                got = conn.execute(sql, {"q": "[" + ",".join(map(str, qvec.tolist())) + "]", "u": uid, "k": k}).scalars().all()
+                latencies.append((time.perf_counter() - t0) * 1000)
+            recalls.append(len(set(got) & truth) / max(1, min(k, len(truth))))
+    return latencies, recalls
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--topics", type=int, default=512, help="Shared topic centres; users draw from them")
+    parser.add_argument("--topics-per-user", type=int, default=8)
+    parser.add_argument("--noise", type=float, default=0.08)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=settings.chat_vector_search_limit)
+    parser.add_argument("--kind", default=settings.chat_ann_index if settings.chat_ann_index != "none" else "hnsw", choices=["hnsw", "ivfflat"])
+    parser.add_argument("--ef-search", default="20,40,100,200", help="HNSW ef_search values to sweep")
+    parser.add_argument("--probes", default="1,10,40", help="IVFFlat probes values to sweep")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch table afterwards")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    engine = get_engine()
+    query_users = set(rng.choice(args.users, size=min(args.queries, args.users), replace=False).tolist())
+    t0 = time.perf_counter()
+    per_user = load(engine, rng, args, query_users)
+    print(f"load: {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+
+    settings.chat_ann_index = args.kind
+    t0 = time.perf_counter()
+    print(f"index: {ensure_vector_index(engine, rebuild=True, table=TABLE, name=INDEX)} in {time.perf_counter() - t0:.1f}s")
+
+    queries = []
+    for u, (ids, vecs, centres) in per_user.items():
+        if len(ids) == 0:
+            continue
+        q = _unit((centres[rng.integers(len(centres))] + args.noise * rng.standard_normal(DIM).astype(np.float32))[None, :])[0]
+        # Exact neighbours: smallest cosine distance = largest dot product of unit vectors
+        truth = set(ids[np.argsort(-(vecs @ q), kind="stable")[: args.k]].tolist())
+        queries.append((_user_id(u).decode(), q, truth))
+
+    with engine.connect() as conn:
+        version = _parse_version(conn.execute(text("SELECT extversion FROM pg_extension WHERE extname = 'vector'")).scalar())
+    sweeps = [("exact (no ANN index)", ["SET LOCAL enable_indexscan = off", "SET LOCAL enable_bitmapscan = on"])]
+    values = args.ef_search if args.kind == "hnsw" else args.probes
+    for v in [int(x) for x in values.split(",") if x]:
+        for mode in (["off", "relaxed_order"] if version >= (0, 8, 0) else ["off"]):
+            if args.kind == "hnsw":
+                settings.chat_hnsw_ef_search = v
+            else:
+                settings.chat_ivfflat_probes = v
+            settings.chat_ann_iterative_scan = mode
+            label = f"{args.kind} {'ef_search' if args.kind == 'hnsw' else 'probes'}={v} iterative_scan={mode}"
+            sweeps.append((label, _settings_for(version)))
+
+    avg_per_user = args.messages / args.users
+    print(f"\n{args.messages} messages, {args.users} users (~{avg_per_user:.0f}/user), {len(queries)} queries, k={args.k}, pgvector {'.'.join(map(str, version))}")
+    print(f"{'configuration':<52} {'recall@k':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for label, session_sql in sweeps:
+        run_queries(engine, queries[:10], args.k, session_sql)  # warm-up
+        lat, rec = run_queries(engine, queries, args.k, session_sql)
+        print(f"{label:<52} {statistics.mean(rec):>9.3f} {percentile(lat, 50):>8.2f} {percentile(lat, 95):>8.2f} {percentile(lat, 99):>8.2f}")
+
+    if not args.keep:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""In-process caches (a bounded LRU with optional TTL) and shared per-patient data versions.
+
+Data versions live in the data_versions table and are bumped in the transaction that changes a
+patient or their check-ins, so cache keys and ETags that include the version stop matching on
+every app instance as soon as the new data is visible.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Iterable, Optional
+
+from sqlalchemy import event, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from database import DataVersion
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU with optional per-entry TTL (seconds) and hit/miss counters."""
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is not _MISSING and self.ttl is not None and time.monotonic() - item[0] > self.ttl:
+                del self._data[key]
+                item = _MISSING
+            if item is _MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def items(self) -> list:
+        """Unexpired (key, value) pairs, most recently used last."""
+        now = time.monotonic()
+        with self._lock:
+            return [(k, v) for k, (t, v) in self._data.items() if self.ttl is None or now - t <= self.ttl]
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0,
+            }
+
+
+# data_versions scope counting changes to any patient (lists spanning all patients)
+GLOBAL_SCOPE = "*"
+_BUMP_SQL = text(
+    "INSERT INTO data_versions (scope, version) VALUES (:scope, 1) "
+    "ON CONFLICT (scope) DO UPDATE SET version = data_versions.version + 1"
+)
+
+
+def mark_patients_changed(db, patient_ids: Iterable[str]) -> None:
+    """Bump these patients' data versions (and the global one) in db's transaction when it commits."""
+    db.info.setdefault("changed_patients", set()).update(patient_ids)
+
+
+async def get_data_version(db: AsyncSession, scope: str) -> int:
+    """Shared data version of a patient id or GLOBAL_SCOPE (0 until the first change)."""
+    return await db.scalar(select(DataVersion.version).where(DataVersion.scope == scope)) or 0
+
+
+def bump_data_versions(conn, patient_ids: Iterable[str]) -> None:
+    """Bump these patients' versions and the global one in conn's (or a Session's) current transaction."""
+    # Sorted so concurrent writers lock the rows in one order (no deadlocks)
+    conn.execute(_BUMP_SQL, [{"scope": scope} for scope in sorted({GLOBAL_SCOPE, *patient_ids})])
+
+
+@event.listens_for(Session, "before_commit")
+def _bump_versions_in_transaction(session: Session) -> None:
+    changed = session.info.get("changed_patients")
+    if changed:
+        # Same transaction as the write: every instance sees the new version exactly when it sees the data
+        bump_data_versions(session, changed)
+
+
+@event.listens_for(Session, "after_commit")
+def _clear_after_commit(session: Session) -> None:
+    session.info.pop("changed_patients", None)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session: Session) -> None:
+    session.info.pop("changed_patients", None)
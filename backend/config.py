@@ -18,12 +18,42 @@ def _resolve_database_url(value: str) -> str:
 
 class Settings(BaseSettings):
     database_url: str = Field(default="", description="PostgreSQL URL (required for DB; empty allows server to start for Cloud Run health checks)")
+    database_read_url: str = Field(default="", env="DATABASE_READ_URL", description="Optional read replica for read-only routes (URL or secret file path)")
+    # Connection pool per request engine (primary, replica) and process: keep instances x (size + overflow) under the Cloud SQL connection limit
+    db_pool_size: int = Field(default=5, env="DB_POOL_SIZE")
+    db_max_overflow: int = Field(default=5, env="DB_MAX_OVERFLOW")
+    db_pool_timeout: float = Field(default=30.0, env="DB_POOL_TIMEOUT", description="Seconds to wait for a pooled connection")
+    db_pool_recycle_seconds: int = Field(default=1800, env="DB_POOL_RECYCLE_SECONDS", description="Replace connections older than this (-1 = never)")
+    db_pool_pre_ping: bool = Field(default=True, env="DB_POOL_PRE_PING")
+    db_statement_timeout_ms: int = Field(default=30000, env="DB_STATEMENT_TIMEOUT_MS", description="Per-statement limit for request traffic (0 = none)")
     secret_key: str = Field(default="change-me-in-production", env="SECRET_KEY")
     algorithm: str = Field(default="HS256", env="ALGORITHM")
     access_token_expire_minutes: int = Field(default=10080, env="ACCESS_TOKEN_EXPIRE_MINUTES")
     host: str = Field(default="0.0.0.0", env="HOST")
     port: int = Field(default=8000, env="PORT")
     cors_origins: str = Field(default="http://localhost:5173,http://127.0.0.1:5173", env="CORS_ORIGINS")
+    auth_cache_size: int = Field(default=10000, env="AUTH_CACHE_SIZE", description="Authenticated users kept in memory")
+    auth_cache_ttl: float = Field(default=300.0, env="AUTH_CACHE_TTL")
+    # Conditional GET on list endpoints: ETags from the shared data_versions table (304 on If-None-Match)
+    etag_enabled: bool = Field(default=True, env="ETAG_ENABLED")
+    # bcrypt runs in a process pool: PASSWORD_WORKERS processes, bounded wait queue (else 503)
+    password_workers: int = Field(default=2, env="PASSWORD_WORKERS")
+    password_max_queue: int = Field(default=64, env="PASSWORD_MAX_QUEUE")
+    password_queue_timeout: float = Field(default=5.0, env="PASSWORD_QUEUE_TIMEOUT")
+    login_max_attempts: int = Field(default=5, env="LOGIN_MAX_ATTEMPTS", description="Unsuccessful logins per email per window before 429")
+    login_attempt_window: float = Field(default=300.0, env="LOGIN_ATTEMPT_WINDOW")
+    # Boot: auto = run schema DDL only when its stored fingerprint is out of date; always; never (run maintenance.py migrate)
+    startup_ddl: str = Field(default="auto", env="STARTUP_DDL")
+    startup_warmup: bool = Field(default=True, env="STARTUP_WARMUP", description="Warm DB pools, LLM client, embedding model and password workers in the background after boot")
+    # GET /metrics (Prometheus) and Server-Timing headers; METRICS_TOKEN set = /metrics requires "Authorization: Bearer <token>"
+    metrics_enabled: bool = Field(default=True, env="METRICS_ENABLED")
+    server_timing_enabled: bool = Field(default=True, env="SERVER_TIMING_ENABLED")
+    metrics_token: str = Field(default="", env="METRICS_TOKEN")
+    # Opt-in SQL profiler: per-request query count/time, slow-query log (params redacted), N+1 warnings
+    sql_profile: bool = Field(default=False, env="SQL_PROFILE")
+    sql_slow_query_ms: float = Field(default=200.0, env="SQL_SLOW_QUERY_MS")
+    sql_repeat_threshold: int = Field(default=5, env="SQL_REPEAT_THRESHOLD", description="Same statement this often in one request is logged as a possible N+1")
+    check_in_batch_max: int = Field(default=1000, env="CHECK_IN_BATCH_MAX", description="Max items per POST /check-ins/batch")
     
     # LLM / RAG settings
     llm_provider: str = Field(default="ollama", env="LLM_PROVIDER", description="'ollama' for local, 'vertex' for cloud")
@@ -35,12 +65,55 @@ class Settings(BaseSettings):
     vertex_embedding_model: str = Field(default="text-embedding-005", env="VERTEX_EMBEDDING_MODEL")
     vector_search_index_endpoint_id: str = Field(default="", env="VECTOR_SEARCH_INDEX_ENDPOINT_ID")
     chat_vector_search_limit: int = Field(default=5, env="CHAT_VECTOR_SEARCH_LIMIT")
+    # Prompt size (estimated tokens; see context_builder.py)
+    rag_context_token_budget: int = Field(default=800, env="RAG_CONTEXT_TOKEN_BUDGET", description="Patient table + past chats")
+    rag_patient_token_budget: int = Field(default=500, env="RAG_PATIENT_TOKEN_BUDGET", description="Share of the context for patient info and check-ins")
+    rag_history_token_budget: int = Field(default=400, env="RAG_HISTORY_TOKEN_BUDGET", description="Conversation history sent with the question")
+    rag_context_check_ins: int = Field(default=14, env="RAG_CONTEXT_CHECK_INS", description="Most recent check-ins considered for the table")
+    rag_chat_snippet_tokens: int = Field(default=100, env="RAG_CHAT_SNIPPET_TOKENS")
+    rag_note_tokens: int = Field(default=20, env="RAG_NOTE_TOKENS")
+    rag_chars_per_token: float = Field(default=4.0, env="RAG_CHARS_PER_TOKEN")
+    rag_context_cache_size: int = Field(default=1024, env="RAG_CONTEXT_CACHE_SIZE", description="Users whose patient/check-in context is cached (0 disables)")
+    rag_context_cache_ttl: float = Field(default=300.0, env="RAG_CONTEXT_CACHE_TTL", description="Seconds; entries are also invalidated by the shared data version")
+    # Semantic answer cache (opt-in): reuse an answer for a near-identical question while the user's data is unchanged
+    answer_cache_enabled: bool = Field(default=False, env="ANSWER_CACHE_ENABLED")
+    answer_cache_max_distance: float = Field(default=0.05, env="ANSWER_CACHE_MAX_DISTANCE", description="Max cosine distance between queries")
+    answer_cache_ttl: float = Field(default=3600.0, env="ANSWER_CACHE_TTL")
+    answer_cache_max_users: int = Field(default=1024, env="ANSWER_CACHE_MAX_USERS")
+    answer_cache_per_user: int = Field(default=32, env="ANSWER_CACHE_PER_USER")
+    embedding_provider: str = Field(default="", env="EMBEDDING_PROVIDER", description="'vertex', 'ollama', 'hashing' (offline) or 'none'; empty = vertex with LLM_PROVIDER=vertex, else none")
+    ollama_embedding_model: str = Field(default="nomic-embed-text", env="OLLAMA_EMBEDDING_MODEL")
+    ollama_embedding_batch_size: int = Field(default=64, env="OLLAMA_EMBEDDING_BATCH_SIZE", description="Texts per /api/embed request")
+    embedding_cache_size: int = Field(default=2048, env="EMBEDDING_CACHE_SIZE", description="Embeddings kept in the in-process LRU (0 disables)")
+    # ANN index on chat_messages.embedding (see vector_index.py): hnsw | ivfflat | none
+    chat_ann_index: str = Field(default="hnsw", env="CHAT_ANN_INDEX")
+    chat_hnsw_m: int = Field(default=16, env="CHAT_HNSW_M")
+    chat_hnsw_ef_construction: int = Field(default=64, env="CHAT_HNSW_EF_CONSTRUCTION")
+    chat_hnsw_ef_search: int = Field(default=100, env="CHAT_HNSW_EF_SEARCH", description="Candidates per HNSW query; higher = better recall, slower")
+    chat_ivfflat_lists: int = Field(default=0, env="CHAT_IVFFLAT_LISTS", description="0 sizes lists from the row count")
+    chat_ivfflat_probes: int = Field(default=10, env="CHAT_IVFFLAT_PROBES")
+    chat_ann_iterative_scan: str = Field(default="relaxed_order", env="CHAT_ANN_ITERATIVE_SCAN", description="pgvector 0.8+ filtered search: relaxed_order | strict_order | off")
+    chat_ann_autocreate_max_rows: int = Field(default=200_000, env="CHAT_ANN_AUTOCREATE_MAX_ROWS", description="Build the index at startup only below this many embedded rows")
+    chat_ann_maintenance_work_mem: str = Field(default="512MB", env="CHAT_ANN_MAINTENANCE_WORK_MEM")
+    # Background embedding of chat messages (see embedding_worker.py)
+    embedding_batch_size: int = Field(default=32, env="EMBEDDING_BATCH_SIZE")
+    embedding_max_retries: int = Field(default=3, env="EMBEDDING_MAX_RETRIES")
+    embedding_retry_delay: float = Field(default=2.0, env="EMBEDDING_RETRY_DELAY", description="Seconds before the first retry; doubles each attempt")
+    # Shared HTTP client for Ollama (keep-alive pool) and LLM concurrency limit
+    ollama_max_connections: int = Field(default=10, env="OLLAMA_MAX_CONNECTIONS")
+    ollama_max_keepalive: int = Field(default=5, env="OLLAMA_MAX_KEEPALIVE")
+    llm_connect_timeout: float = Field(default=5.0, env="LLM_CONNECT_TIMEOUT")
+    llm_read_timeout: float = Field(default=120.0, env="LLM_READ_TIMEOUT")
+    llm_max_in_flight: int = Field(default=2, env="LLM_MAX_IN_FLIGHT", description="Concurrent generations sent to the model")
+    llm_max_queue: int = Field(default=20, env="LLM_MAX_QUEUE", description="Requests allowed to wait for a slot; more are rejected (503)")
+    llm_queue_timeout: float = Field(default=15.0, env="LLM_QUEUE_TIMEOUT", description="Seconds to wait for a slot before 503")
 
     model_config = {"env_file": (".env", ".env.local", ".env.production"), "extra": "ignore"}
 
     @model_validator(mode="after")
     def resolve_secret_paths(self):
         self.database_url = _resolve_database_url(self.database_url)
+        self.database_read_url = _resolve_database_url(self.database_read_url)
         # Fallback: Cloud Run / GitHub may set GCP_PROJECT_ID instead of GOOGLE_CLOUD_PROJECT
         if not (self.google_cloud_project or "").strip():
             fallback = (os.environ.get("GCP_PROJECT_ID") or "").strip()
@@ -0,0 +1,132 @@
+"""
+Token-budgeted RAG context: a compact per-day symptom table with trends, ranked past-chat
+snippets and trimmed conversation history.
+
+Token counts are estimates (RAG_CHARS_PER_TOKEN characters per token); no tokenizer is loaded.
+They only need to be consistent, since they size prompts rather than bill them.
+"""
+import math
+from typing import List, Optional, Sequence
+
+from config import settings
+from scores import SYMPTOM_KEYS
+
+# Change in mean (older half -> newer half of the window) reported as a trend
+TREND_THRESHOLD = 0.5
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / settings.rag_chars_per_token) if text else 0
+
+
+def truncate_to_tokens(text: str, tokens: int) -> str:
+    """Cut text to roughly `tokens` tokens, at a word boundary when possible."""
+    limit = int(tokens * settings.rag_chars_per_token)
+    if len(text) <= limit:
+        return text
+    if limit <= 3:
+        return ""
+    cut = text[: limit - 3]
+    space = cut.rfind(" ")
+    if space > limit // 2:
+        cut = cut[:space]
+    return cut.rstrip() + "..."
+
+
+def _num(value) -> str:
+    return f"{float(value or 0):g}"
+
+
+def _trends(rows: Sequence[dict], keys: Sequence[str]) -> str:
+    """'fatigue up 2->4, cough down 3->1' comparing the older and newer half of rows (newest first)."""
+    if len(rows) < 2:
+        return ""
+    half = len(rows) // 2
+    newer, older = rows[:half], rows[half:]
+    changes = []
+    for k in list(keys) + ["sleep_hours", "risk_score"]:
+        before = sum(float(r.get(k) or 0) for r in older) / len(older)
+        after = sum(float(r.get(k) or 0) for r in newer) / len(newer)
+        if abs(after - before) >= TREND_THRESHOLD:
+            name = {"sleep_hours": "sleep", "risk_score": "risk"}.get(k, k)
+            changes.append(f"{name} {'up' if after > before else 'down'} {before:.1f}->{after:.1f}")
+    return "Trends (older->newer): " + (", ".join(changes) if changes else "no notable change")
+
+
+def patient_section(patient, rows: Sequence[dict], budget: int) -> str:
+    """
+    Patient line, trends and one table row per check-in (rows: check_ins_to_response dicts,
+    newest first), cut to the newest rows that fit in budget tokens. Symptom columns that are
+    zero on every row are left out.
+    """
+    if patient is None:
+        return ""
+    lines = [f"Patient: {patient.name}, age {patient.age}, condition {patient.condition}"]
+    if not rows:
+        return truncate_to_tokens(lines[0], budget)
+    keys = [k for k in SYMPTOM_KEYS if any(r.get(k) for r in rows)]
+    extra = [c for c in ("appetite", "mobility") if any((r.get(c) or "Normal") != "Normal" for r in rows)]
+    lines.append(_trends(rows, keys))
+    lines.append("Check-ins (newest first; symptoms 0-10):")
+    lines.append("|".join(["date", *keys, "sleep", "meds", *extra, "risk", "status", "notes"]))
+    used = estimate_tokens("\n".join(lines))
+    for r in rows:
+        notes = truncate_to_tokens((r.get("notes") or "").replace("\n", " ").replace("|", "/"), settings.rag_note_tokens)
+        row = "|".join([
+            (r.get("date") or "")[:10],
+            *(_num(r.get(k)) for k in keys),
+            _num(r.get("sleep_hours")),
+            "y" if r.get("meds_taken", True) else "n",
+            *((r.get(c) or "Normal") for c in extra),
+            _num(r.get("risk_score")),
+            r.get("status") or "",
+            notes,
+        ])
+        cost = estimate_tokens(row) + 1
+        if used + cost > budget:
+            break
+        lines.append(row)
+        used += cost
+    text = "\n".join(lines)
+    return text if estimate_tokens(text) <= budget else truncate_to_tokens(text, budget)
+
+
+def chat_section(messages: Sequence, budget: int) -> str:
+    """Past chat snippets (messages with .role/.content, best match first), each trimmed, until budget is spent."""
+    lines: List[str] = []
+    used = 0
+    for msg in messages:
+        remaining = budget - used
+        if remaining < 8:
+            break
+        line = f"Past chat ({msg.role}): " + " ".join((msg.content or "").split())
+        line = truncate_to_tokens(line, min(settings.rag_chat_snippet_tokens, remaining - 1))
+        if not line:
+            break
+        lines.append(line)
+        used += estimate_tokens(line) + 1
+    return "\n".join(lines)
+
+
+def fit_history(history: Optional[List[dict]], budget: int) -> List[dict]:
+    """Newest conversation turns that fit in budget tokens (oldest of them trimmed if needed), in order."""
+    if not history or budget <= 0:
+        return []
+    kept: List[dict] = []
+    used = 0
+    for msg in reversed(history):
+        content = msg.get("content") or ""
+        cost = estimate_tokens(content) + 4  # role and message framing
+        if used + cost > budget:
+            remaining = budget - used - 4
+            if remaining >= 16:
+                kept.append({**msg, "content": truncate_to_tokens(content, remaining)})
+            break
+        kept.append(msg)
+        used += cost
+    return list(reversed(kept))
+
+
+def messages_tokens(messages: Sequence[dict]) -> int:
+    """Estimated prompt size of a chat message list."""
+    return sum(estimate_tokens(m.get("content") or "") + 4 for m in messages)
@@ -1,30 +1,152 @@
 """DB engine, session, and models. PostgreSQL only (e.g. Cloud SQL or local)."""
-from collections.abc import Generator
+from collections.abc import AsyncGenerator
 from datetime import datetime
 from typing import Annotated
 
 from fastapi import Depends
-from sqlalchemy import Boolean, Column, DateTime, Float, ForeignKey, Integer, String, Text, create_engine
-from sqlalchemy.orm import Session, declarative_base, sessionmaker
+from sqlalchemy import BigInteger, Boolean, Column, DateTime, Float, ForeignKey, Index, Integer, String, Text, create_engine, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.pool import NullPool
 
 from config import settings
+from metrics import stage
+from sql_profiler import instrument_engine
 
 from pgvector.sqlalchemy import Vector
 
 _engine = None
 _session_factory = None
+_async_engine = None
+_async_session_factory = None
+_async_read_engine = None
+_async_read_session_factory = None
+
+
+def _database_url() -> str:
+    url = (settings.database_url or "").strip()
+    if not url:
+        raise RuntimeError("DATABASE_URL is not set. Set the env var or Cloud Run secret DATABASE_URL_SECRET.")
+    return url
+
+
+def _pool_options() -> dict:
+    """Pool sizing from Settings for the request engines (async primary and read replica): per process,
+    each holds up to DB_POOL_SIZE + DB_MAX_OVERFLOW connections."""
+    return {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle_seconds,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
 
 
 def _get_engine():
     global _engine
     if _engine is None:
-        url = (settings.database_url or "").strip()
-        if not url:
-            raise RuntimeError("DATABASE_URL is not set. Set the env var or Cloud Run secret DATABASE_URL_SECRET.")
-        _engine = create_engine(url, pool_pre_ping=True)
+        # No statement timeout here: this engine runs startup DDL, index builds and maintenance commands.
+        # NullPool: those are rare, so it opens a connection per use instead of keeping a pool per process
+        _engine = create_engine(_database_url(), poolclass=NullPool)
+        if settings.sql_profile:
+            instrument_engine(_engine)
     return _engine
 
 
+def _async_url(url: str):
+    """Same database via the asyncpg driver (postgresql:// or postgresql+psycopg2:// -> postgresql+asyncpg://)."""
+    u = make_url(url)
+    if u.drivername in ("postgres", "postgresql", "postgresql+psycopg2"):
+        u = u.set(drivername="postgresql+asyncpg")
+    if "sslmode" in u.query:
+        # asyncpg takes ssl=<mode> instead of libpq's sslmode
+        u = u.difference_update_query(["sslmode"]).update_query_dict({"ssl": u.query["sslmode"]})
+    return u
+
+
+async def _register_vector_codec(conn) -> None:
+    # pgvector's SQLAlchemy type binds/parses the text form; let asyncpg pass it through as text
+    await conn.set_type_codec("vector", encoder=str, decoder=str, format="text")
+
+
+def _create_async_engine(url: str):
+    """asyncpg engine for request traffic: pool settings, DB_STATEMENT_TIMEOUT_MS, vector codec, profiler."""
+    connect_args = {}
+    if settings.db_statement_timeout_ms > 0:
+        connect_args["server_settings"] = {"statement_timeout": str(int(settings.db_statement_timeout_ms))}
+    engine = create_async_engine(_async_url(url), connect_args=connect_args, **_pool_options())
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        try:
+            dbapi_connection.run_async(_register_vector_codec)
+        except ValueError:
+            pass  # vector extension not installed (unknown type)
+
+    if settings.sql_profile:
+        instrument_engine(engine.sync_engine)
+    return engine
+
+
+def _get_async_engine():
+    global _async_engine
+    if _async_engine is None:
+        _async_engine = _create_async_engine(_database_url())
+    return _async_engine
+
+
+def _get_async_session_factory():
+    global _async_session_factory
+    if _async_session_factory is None:
+        _async_session_factory = async_sessionmaker(_get_async_engine(), autoflush=False, expire_on_commit=False)
+    return _async_session_factory
+
+
+def read_replica_enabled() -> bool:
+    """True when DATABASE_READ_URL is set: read-only routes then query the replica."""
+    return bool((settings.database_read_url or "").strip())
+
+
+def _get_async_read_session_factory():
+    global _async_read_engine, _async_read_session_factory
+    if not read_replica_enabled():
+        return _get_async_session_factory()
+    if _async_read_session_factory is None:
+        _async_read_engine = _create_async_engine(settings.database_read_url.strip())
+        _async_read_session_factory = async_sessionmaker(_async_read_engine, autoflush=False, expire_on_commit=False)
+    return _async_read_session_factory
+
+
+async def dispose_async_engine() -> None:
+    """Close pooled asyncpg connections (app shutdown)."""
+    global _async_engine, _async_session_factory, _async_read_engine, _async_read_session_factory
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
+        _async_session_factory = None
+    if _async_read_engine is not None:
+        await _async_read_engine.dispose()
+        _async_read_engine = None
+        _async_read_session_factory = None
+
+
+def get_async_engine():
+    """Return the asyncpg engine (lazy-init)."""
+    return _get_async_engine()
+
+
+def get_async_session_factory():
+    """Return the AsyncSession factory (lazy-init). Use `async with get_async_session_factory()() as db` for short-lived sessions."""
+    return _get_async_session_factory()
+
+
+def get_async_read_session_factory():
+    """AsyncSession factory for reads: the replica (DATABASE_READ_URL) when configured, else the primary.
+    Replicas lag slightly, so use it only where a just-committed write need not be visible."""
+    return _get_async_read_session_factory()
+
+
 def _get_session_factory():
     global _session_factory
     if _session_factory is None:
@@ -37,23 +159,57 @@ def get_engine():
     return _get_engine()
 
 
+def get_session_factory():
+    """Return the sessionmaker (lazy-init). Use outside requests, e.g. maintenance commands."""
+    return _get_session_factory()
+
+
 Base = declarative_base()
 
 
-def get_db() -> Generator[Session, None, None]:
-    SessionLocal = _get_session_factory()
-    db = SessionLocal()
-    try:
-        yield db
-        db.commit()
-    except Exception:
-        db.rollback()
-        raise
-    finally:
-        db.close()
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    with stage("db_session"):
+        async with _get_async_session_factory()() as db:
+            try:
+                yield db
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+
 
+AsyncDbSession = Annotated[AsyncSession, Depends(get_async_db)]
 
-DbSession = Annotated[Session, Depends(get_db)]
+
+async def get_async_read_db() -> AsyncGenerator[AsyncSession, None]:
+    """Read-only session (replica when DATABASE_READ_URL is set). Nothing is committed."""
+    with stage("db_session"):
+        async with _get_async_read_session_factory()() as db:
+            yield db
+
+
+AsyncReadDbSession = Annotated[AsyncSession, Depends(get_async_read_db)]
+
+
+# Idempotent DDL for tables that already exist (create_all only creates missing tables).
+MIGRATIONS = (
+    "CREATE INDEX IF NOT EXISTS ix_check_ins_patient_id_date_id ON check_ins (patient_id, date DESC, id DESC)",
+    "ALTER TABLE check_ins ADD COLUMN IF NOT EXISTS symptom_score FLOAT",
+    "ALTER TABLE check_ins ADD COLUMN IF NOT EXISTS risk_score FLOAT",
+    "ALTER TABLE check_ins ADD COLUMN IF NOT EXISTS status VARCHAR(20)",
+    "ALTER TABLE check_ins ADD COLUMN IF NOT EXISTS score_version INTEGER",
+    "CREATE INDEX IF NOT EXISTS ix_check_ins_status_date ON check_ins (status, date)",
+    "ALTER TABLE chat_messages ADD COLUMN IF NOT EXISTS user_id VARCHAR(36) REFERENCES users(id)",
+    "CREATE INDEX IF NOT EXISTS ix_chat_messages_user_id ON chat_messages (user_id)",
+    # Backfill from the owning conversation; finds nothing to do (via the index on NULLs) once done
+    "UPDATE chat_messages m SET user_id = c.user_id FROM conversations c WHERE c.id = m.conversation_id AND m.user_id IS NULL",
+)
+
+
+def apply_migrations(engine) -> None:
+    with engine.begin() as conn:
+        for stmt in MIGRATIONS:
+            conn.execute(text(stmt))
 
 
 class User(Base):
@@ -99,6 +255,17 @@ class CheckIn(Base):
     mobility = Column(String(20), default="Normal")
     devices = Column(Text, nullable=True)
     notes = Column(Text, nullable=True)
+    # Computed once at write time (scores.apply_scores); score_version marks which rules produced them
+    symptom_score = Column(Float, nullable=True)
+    risk_score = Column(Float, nullable=True)
+    status = Column(String(20), nullable=True)
+    score_version = Column(Integer, nullable=True)
+
+    # Keyset pagination: per-patient history newest first, (date, id) as a stable tiebreak
+    __table_args__ = (
+        Index("ix_check_ins_patient_id_date_id", "patient_id", date.desc(), id.desc()),
+        Index("ix_check_ins_status_date", "status", "date"),
+    )
 
 
 # Chat storage: SQL + vector (pgvector). Embedding optional when using Ollama.
@@ -114,7 +281,17 @@ class ChatMessage(Base):
     __tablename__ = "chat_messages"
     id = Column(String(36), primary_key=True)
     conversation_id = Column(String(36), ForeignKey("conversations.id", ondelete="CASCADE"), nullable=False, index=True)
+    # Denormalized from conversations.user_id so per-user vector search needs no join
+    user_id = Column(String(36), ForeignKey("users.id"), nullable=True, index=True)
     role = Column(String(20), nullable=False)
     content = Column(Text, nullable=False)
     created_at = Column(DateTime(timezone=True), default=datetime.utcnow)
     embedding = Column(Vector(768), nullable=True)
+
+
+class DataVersion(Base):
+    """Change counter per patient (scope = patient id) and for all patients (scope "*"), bumped in the
+    writing transaction (cache.mark_patients_changed) and shared by every app instance."""
+    __tablename__ = "data_versions"
+    scope = Column(String(36), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
@@ -0,0 +1,161 @@
+"""
+Background embedding of chat messages.
+
+Chat routes store messages with embedding=NULL and enqueue their ids; the worker batches
+pending ids, embeds them with one get_embeddings call per batch and writes vectors back
+with a bulk UPDATE. Failed batches are retried with backoff; anything still NULL (worker
+stopped, retries exhausted) is picked up by `python maintenance.py backfill-embeddings`.
+"""
+import asyncio
+import logging
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from config import settings
+from database import ChatMessage, get_async_session_factory
+from embeddings import embeddings_enabled, get_embeddings
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingWorker:
+    """asyncio task that embeds queued chat_messages ids in batches."""
+
+    def __init__(self, batch_size: int, max_retries: int, retry_delay: float):
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self._queue: "asyncio.Queue[tuple[str, int]]" = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        self.embedded = 0
+        self.failed = 0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def enqueue(self, message_ids: Iterable[str]) -> None:
+        """Schedule messages for embedding. No-op when embeddings are unavailable."""
+        if not embeddings_enabled():
+            return
+        for message_id in message_ids:
+            self._queue.put_nowait((message_id, 0))
+
+    async def _next_batch(self) -> List[tuple[str, int]]:
+        batch = [await self._queue.get()]
+        while len(batch) < self.batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            attempts = dict(batch)
+            try:
+                done = await self._embed(list(attempts))
+            except Exception:
+                logger.exception("Embedding batch of %d messages failed", len(attempts))
+                done = set()
+            retry = [(mid, n + 1) for mid, n in attempts.items() if mid not in done]
+            if not retry:
+                continue
+            exhausted = [mid for mid, n in retry if n > self.max_retries]
+            if exhausted:
+                self.failed += len(exhausted)
+                logger.warning("Giving up embedding %d messages; run backfill-embeddings later", len(exhausted))
+            by_attempt: Dict[int, List[tuple[str, int]]] = {}
+            for mid, n in retry:
+                if n <= self.max_retries:
+                    by_attempt.setdefault(n, []).append((mid, n))
+            loop = asyncio.get_running_loop()
+            for n, items in by_attempt.items():
+                loop.call_later(self.retry_delay * 2 ** (n - 1), self._requeue, items)
+
+    def _requeue(self, items: List[tuple[str, int]]) -> None:
+        for item in items:
+            self._queue.put_nowait(item)
+
+    async def _embed(self, message_ids: List[str]) -> set:
+        """Embed the given messages that are still NULL. Returns ids that no longer need work."""
+        async with get_async_session_factory()() as db:
+            rows = (
+                await db.execute(
+                    select(ChatMessage.id, ChatMessage.content).where(
+                        ChatMessage.id.in_(message_ids), ChatMessage.embedding.is_(None)
+                    )
+                )
+            ).all()
+            # Deleted or already-embedded ids, and blank messages, need nothing further
+            rows = [r for r in rows if r.content and r.content.strip()]
+            done = set(message_ids) - {r.id for r in rows}
+            if not rows:
+                return done
+            vectors = await run_in_threadpool(get_embeddings, [r.content for r in rows])
+            values = [{"id": r.id, "embedding": v} for r, v in zip(rows, vectors) if v is not None]
+            if values:
+                await db.execute(update(ChatMessage), values)
+                await db.commit()
+                self.embedded += len(values)
+            return done | {v["id"] for v in values}
+
+
+_worker: Optional[EmbeddingWorker] = None
+
+
+def get_embedding_worker() -> EmbeddingWorker:
+    global _worker
+    if _worker is None:
+        _worker = EmbeddingWorker(
+            batch_size=settings.embedding_batch_size,
+            max_retries=settings.embedding_max_retries,
+            retry_delay=settings.embedding_retry_delay,
+        )
+    return _worker
+
+
+def start_embedding_worker() -> None:
+    get_embedding_worker().start()
+
+
+async def stop_embedding_worker() -> None:
+    global _worker
+    if _worker is not None:
+        await _worker.stop()
+        _worker = None
+
+
+def backfill_embeddings(db: Session, batch_size: int = 100) -> Dict[str, int]:
+    """Embed chat messages whose embedding is NULL (sync, for the maintenance CLI). Returns counts."""
+    counts = {"embedded": 0, "skipped": 0}
+    if not embeddings_enabled():
+        return counts
+    last_id = ""
+    while True:
+        rows = db.execute(
+            select(ChatMessage.id, ChatMessage.content)
+            .where(ChatMessage.embedding.is_(None), ChatMessage.id > last_id)
+            .order_by(ChatMessage.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return counts
+        vectors = get_embeddings([r.content or "" for r in rows])
+        values = [{"id": r.id, "embedding": v} for r, v in zip(rows, vectors) if v is not None]
+        if values:
+            db.execute(update(ChatMessage), values)
+            db.commit()
+        counts["embedded"] += len(values)
+        counts["skipped"] += len(rows) - len(values)
+        last_id = rows[-1].id
@@ -1,34 +1,232 @@
-"""Text embeddings for chat vector search. Uses Vertex AI when LLM provider is vertex."""
+"""Text embeddings for chat vector search.
+
+The backend is chosen by EMBEDDING_PROVIDER (empty: vertex with LLM_PROVIDER=vertex, else none;
+ollama is opt-in because it needs an embedding model pulled):
+- vertex: Vertex AI TextEmbeddingModel (model handle created once per process)
+- ollama: local Ollama /api/embed, batched; vectors are fitted to EMBEDDING_DIM
+- hashing: deterministic offline feature-hashing embedder (tests, air-gapped installs)
+- none: embeddings disabled
+
+Results are memoized in a bounded LRU keyed by (model, task_type, sha256(text)), so the
+same text (e.g. the user's message and the retrieval query built from it) is only
+embedded once.
+"""
+import hashlib
+import math
+import re
+import threading
+from collections import OrderedDict
 from typing import List, Optional
 
+from cache import TTLCache
 from config import settings
+from metrics import stage
 
+# Width of the chat_messages.embedding column (Vector(768))
+EMBEDDING_DIM = 768
 
-def get_embedding(text: str) -> Optional[List[float]]:
-    """
-    Return embedding vector for text, or None if embeddings are not available
-    (e.g. Ollama provider or Vertex not configured).
-    """
-    if not text or not text.strip():
-        return None
-    if settings.llm_provider.lower() != "vertex":
-        return None
-    if not settings.google_cloud_project:
-        return None
-    try:
-        import vertexai
-        from vertexai.language_models import TextEmbeddingInput, TextEmbeddingModel
+_cache = TTLCache(settings.embedding_cache_size)
+
+
+def embedding_cache_stats() -> dict:
+    """Size and hit/miss counters of the embedding LRU."""
+    return _cache.stats()
+
+
+def _fit(vec: List[float], dim: int = EMBEDDING_DIM) -> List[float]:
+    """Size a vector to dim: truncate and re-normalise when longer, zero-pad when shorter (cosine unchanged)."""
+    if len(vec) == dim:
+        return vec
+    if len(vec) > dim:
+        vec = vec[:dim]
+        norm = math.sqrt(sum(x * x for x in vec))
+        return [x / norm for x in vec] if norm else vec
+    return vec + [0.0] * (dim - len(vec))
+
+
+class EmbeddingBackend:
+    """Embeds a batch of non-blank texts. Raises on failure; get_embeddings turns errors into None."""
+
+    name = ""
+    model = ""
+    max_batch = 256
+
+    def embed(self, texts: List[str], task_type: str) -> List[Optional[List[float]]]:
+        raise NotImplementedError
+
+
+class VertexEmbeddingBackend(EmbeddingBackend):
+    name = "vertex"
+    # Vertex accepts at most 250 inputs per get_embeddings request
+    max_batch = 250
+
+    def __init__(self):
+        self.model = settings.vertex_embedding_model
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _get_model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    import vertexai
+                    from vertexai.language_models import TextEmbeddingModel
+
+                    vertexai.init(project=settings.google_cloud_project, location=settings.google_cloud_location)
+                    self._model = TextEmbeddingModel.from_pretrained(self.model)
+        return self._model
+
+    def embed(self, texts: List[str], task_type: str) -> List[Optional[List[float]]]:
+        from vertexai.language_models import TextEmbeddingInput
 
-        vertexai.init(project=settings.google_cloud_project, location=settings.google_cloud_location)
-        model = TextEmbeddingModel.from_pretrained(settings.vertex_embedding_model)
         # RETRIEVAL_DOCUMENT for stored content; 768 for text-embedding-005
         kwargs = {}
-        if settings.vertex_embedding_model.startswith("text-embedding-"):
-            kwargs["output_dimensionality"] = 768
-        text_input = TextEmbeddingInput(text=text.strip(), task_type="RETRIEVAL_DOCUMENT")
-        emb = model.get_embeddings([text_input], **kwargs)
-        if emb and len(emb) > 0 and hasattr(emb[0], "values"):
-            return list(emb[0].values)
-        return None
-    except Exception:
+        if self.model.startswith("text-embedding-"):
+            kwargs["output_dimensionality"] = EMBEDDING_DIM
+        embs = self._get_model().get_embeddings([TextEmbeddingInput(text=t, task_type=task_type) for t in texts], **kwargs)
+        return [list(e.values) if hasattr(e, "values") else None for e in embs or []]
+
+
+class OllamaEmbeddingBackend(EmbeddingBackend):
+    """Ollama /api/embed, one request per batch. Called from worker threads, so uses a sync pooled client."""
+
+    name = "ollama"
+
+    def __init__(self):
+        import httpx
+
+        self.model = settings.ollama_embedding_model
+        self.max_batch = settings.ollama_embedding_batch_size
+        self.url = f"{settings.ollama_base_url.rstrip('/')}/api/embed"
+        self._http = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=settings.ollama_max_connections,
+                max_keepalive_connections=settings.ollama_max_keepalive,
+            ),
+            timeout=httpx.Timeout(settings.llm_read_timeout, connect=settings.llm_connect_timeout),
+        )
+
+    def embed(self, texts: List[str], task_type: str) -> List[Optional[List[float]]]:
+        # dimensions is honoured by models that support truncation; _fit covers the rest
+        r = self._http.post(self.url, json={"model": self.model, "input": texts, "dimensions": EMBEDDING_DIM})
+        r.raise_for_status()
+        return [_fit([float(x) for x in e]) if e else None for e in r.json().get("embeddings") or []]
+
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+class HashingEmbeddingBackend(EmbeddingBackend):
+    """
+    Deterministic offline embedder: signed feature hashing of word unigrams and bigrams,
+    L2-normalised. Captures lexical overlap only, but needs no model or network.
+    """
+
+    name = "hashing"
+    model = f"hashing-v1-{EMBEDDING_DIM}"
+    max_batch = 10_000
+
+    @staticmethod
+    def _one(text: str) -> Optional[List[float]]:
+        words = _TOKEN_RE.findall(text.lower())
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        if not features:
+            return None
+        vec = [0.0] * EMBEDDING_DIM
+        for f in features:
+            h = int.from_bytes(hashlib.blake2b(f.encode("utf-8"), digest_size=8).digest(), "little")
+            vec[h % EMBEDDING_DIM] += 1.0 if (h >> 63) & 1 else -1.0
+        norm = math.sqrt(sum(x * x for x in vec))
+        return [x / norm for x in vec] if norm else None
+
+    def embed(self, texts: List[str], task_type: str) -> List[Optional[List[float]]]:
+        return [self._one(t) for t in texts]
+
+
+_backend: Optional[EmbeddingBackend] = None
+_backend_resolved = False
+_backend_lock = threading.Lock()
+
+
+def embedding_provider() -> str:
+    """EMBEDDING_PROVIDER, or the pre-EMBEDDING_PROVIDER default: Vertex embeddings with the Vertex LLM only."""
+    if settings.embedding_provider:
+        return settings.embedding_provider.lower()
+    return "vertex" if settings.llm_provider.lower() == "vertex" else "none"
+
+
+def _create_backend() -> Optional[EmbeddingBackend]:
+    provider = embedding_provider()
+    if provider == "vertex":
+        return VertexEmbeddingBackend() if settings.google_cloud_project else None
+    if provider == "ollama":
+        return OllamaEmbeddingBackend()
+    if provider == "hashing":
+        return HashingEmbeddingBackend()
+    if provider == "none":
         return None
+    raise ValueError(f"Unknown embedding provider: {provider}")
+
+
+def get_backend() -> Optional[EmbeddingBackend]:
+    """Configured embedding backend (created once), or None when embeddings are disabled."""
+    global _backend, _backend_resolved
+    if not _backend_resolved:
+        with _backend_lock:
+            if not _backend_resolved:
+                _backend = _create_backend()
+                _backend_resolved = True
+    return _backend
+
+
+def embeddings_enabled() -> bool:
+    """True when an embedding backend is configured."""
+    return get_backend() is not None
+
+
+def get_embeddings(texts: List[str], task_type: str = "RETRIEVAL_DOCUMENT") -> List[Optional[List[float]]]:
+    """
+    Embed several texts; cache misses are sent to the backend in as few requests as possible.
+    Returns one vector (or None when unavailable / blank text / backend error) per input, in order.
+    """
+    out: List[Optional[List[float]]] = [None] * len(texts)
+    backend = get_backend()
+    if backend is None:
+        return out
+    pending: "OrderedDict[tuple, tuple[str, List[int]]]" = OrderedDict()
+    for i, text in enumerate(texts):
+        if not text or not text.strip():
+            continue
+        stripped = text.strip()
+        key = (backend.model, task_type, hashlib.sha256(stripped.encode("utf-8")).hexdigest())
+        if key in pending:
+            pending[key][1].append(i)
+            continue
+        vec = _cache.get(key)
+        if vec is not None:
+            out[i] = list(vec)
+        else:
+            pending[key] = (stripped, [i])
+    items = list(pending.items())
+    for start in range(0, len(items), backend.max_batch):
+        chunk = items[start:start + backend.max_batch]
+        try:
+            with stage("embedding"):
+                vectors = backend.embed([text for _, (text, _) in chunk], task_type)
+        except Exception:
+            continue
+        for (key, (_, indexes)), vec in zip(chunk, vectors):
+            if vec is None:
+                continue
+            _cache.put(key, vec)
+            for i in indexes:
+                out[i] = list(vec)
+    return out
+
+
+def get_embedding(text: str, task_type: str = "RETRIEVAL_DOCUMENT") -> Optional[List[float]]:
+    """
+    Return embedding vector for text, or None if embeddings are not available
+    (EMBEDDING_PROVIDER=none, Vertex not configured, or the backend failed).
+    """
+    return get_embeddings([text], task_type)[0]
@@ -0,0 +1,52 @@
+"""Admission control for scarce resources (model slots, password hashing workers)."""
+import asyncio
+from contextlib import asynccontextmanager
+
+
+class BusyError(Exception):
+    """No slot became free in time; callers answer 503 with Retry-After."""
+
+
+class ConcurrencyLimiter:
+    """Bounded number of in-flight operations with a bounded, time-limited wait queue."""
+
+    def __init__(self, max_in_flight: int, max_queue: int, queue_timeout: float, error: type = BusyError, label: str = "worker"):
+        self._sem = asyncio.Semaphore(max(1, max_in_flight))
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.error = error
+        self.label = label
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    def check(self) -> None:
+        """Non-blocking admission check: raise now if a new caller would be rejected without waiting."""
+        if self._sem.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise self.error(f"Too many requests are waiting for the {self.label}")
+
+    async def acquire(self) -> None:
+        self.check()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._sem.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise self.error(f"No {self.label} slot free within {self.queue_timeout:g}s")
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._sem.release()
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
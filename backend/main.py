@@ -1,29 +1,75 @@
 """FastAPI app. Run: uvicorn main:app --reload --port 8000"""
+import time
+
+# Cold-start tracking: module imports below are timed and logged at startup
+_import_started = time.perf_counter()
+
+import asyncio
+import logging
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from sqlalchemy.exc import OperationalError
 
 from config import settings
-from database import Base, get_engine
+from database import dispose_async_engine, get_engine
+from answer_cache import answer_cache_stats
+from auth import auth_cache_stats
+from embedding_worker import start_embedding_worker, stop_embedding_worker
+from embeddings import embedding_cache_stats
+from metrics import CallbackMetric, MetricsMiddleware, register, render
+from passwords import shutdown_password_pool
+from rag import close_rag_chat, rag_context_cache_stats
 from routes import router
+from sql_profiler import SQLProfilerMiddleware
+from startup import ensure_schema, warm_up, warmup_state
+
+IMPORT_SECONDS = time.perf_counter() - _import_started
+logger = logging.getLogger(__name__)
+
+_CACHES = {"auth": auth_cache_stats, "rag_context": rag_context_cache_stats, "embeddings": embedding_cache_stats, "answers": answer_cache_stats}
+
+
+def _cache_stat(*fields: str):
+    """{(cache,): value} of the first of fields present in each cache's stats (the answer cache counts users, not entries)."""
+
+    def collect():
+        out = {}
+        for name, stats_fn in _CACHES.items():
+            stats = stats_fn()
+            out[(name,)] = next((stats[f] for f in fields if f in stats), 0)
+        return out
+
+    return collect
+
+
+register(CallbackMetric("app_cache_entries", "Entries in an in-process cache", ("cache",), _cache_stat("size", "users")))
+register(CallbackMetric("app_cache_hits_total", "In-process cache hits", ("cache",), _cache_stat("hits"), kind="counter"))
+register(CallbackMetric("app_cache_misses_total", "In-process cache misses", ("cache",), _cache_stat("misses"), kind="counter"))
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    started = time.perf_counter()
     if (settings.database_url or "").strip():
-        engine = get_engine()
-        with engine.connect() as conn:
-            try:
-                conn.execute(__import__("sqlalchemy").text("CREATE EXTENSION IF NOT EXISTS vector"))
-                conn.commit()
-            except Exception:
-                # e.g. local postgres image without pgvector: use pgvector/pgvector:pg16 in docker-compose
-                conn.rollback()
-        Base.metadata.create_all(bind=engine)
+        logger.info("Schema: %s", ensure_schema(get_engine()))
+    start_embedding_worker()
+    warmup = None
+    if settings.startup_warmup:
+        # Runs once the server is accepting connections; GET /ready reports progress
+        warmup = asyncio.create_task(warm_up())
+    else:
+        warmup_state.started = warmup_state.finished = time.perf_counter()
+    logger.info("Startup took %.2fs (imports %.2fs)", time.perf_counter() - started, IMPORT_SECONDS)
     yield
+    if warmup is not None and not warmup.done():
+        warmup.cancel()
+    await stop_embedding_worker()
+    await close_rag_chat()
+    shutdown_password_pool()
+    await dispose_async_engine()
 
 
 app = FastAPI(title="Health Analytics API", lifespan=lifespan)
@@ -52,7 +98,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
+if settings.sql_profile:
+    app.add_middleware(SQLProfilerMiddleware)
+# Outermost: times the whole request, including CORS handling
+app.add_middleware(MetricsMiddleware)
 # All routes under /api (e.g. /api/health, /api/auth/login, /api/check-ins)
 app.include_router(router, prefix="/api")
 
@@ -66,6 +117,21 @@ def root():
 def health_root():
     return {"status": "ok"}
 
+
+@app.get("/metrics")
+def metrics(request: Request):
+    """Prometheus text format: request latency per route, stage timings, cache and LLM slot gauges (this process)."""
+    if settings.metrics_token and request.headers.get("authorization") != f"Bearer {settings.metrics_token}":
+        return PlainTextResponse("Unauthorized\n", status_code=401)
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/ready")
+def ready():
+    """200 once the background warm-up has finished (failed steps are listed, they initialise on first use); 503 before."""
+    state = {**warmup_state.as_dict(), "import_seconds": round(IMPORT_SECONDS, 3)}
+    return JSONResponse(status_code=200 if warmup_state.ready else 503, content=state)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host=settings.host, port=settings.port, reload=True)
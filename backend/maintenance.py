@@ -0,0 +1,78 @@
+"""Maintenance commands. Run: python maintenance.py <command> (uses DATABASE_URL like the app)."""
+import argparse
+
+from database import get_engine, get_session_factory
+from startup import ensure_schema
+
+
+def backfill_scores(args: argparse.Namespace) -> None:
+    from scores import SCORE_VERSION, backfill_scores as _backfill
+
+    db = get_session_factory()()
+    try:
+        n = _backfill(db, batch_size=args.batch_size)
+    finally:
+        db.close()
+    print(f"Backfilled scores (version {SCORE_VERSION}) for {n} check-ins")
+
+
+def backfill_embeddings(args: argparse.Namespace) -> None:
+    from embedding_worker import backfill_embeddings as _backfill
+    from embeddings import embeddings_enabled
+
+    if not embeddings_enabled():
+        print(
+            "Embeddings are not configured; nothing to do. Set EMBEDDING_PROVIDER (empty = vertex with LLM_PROVIDER=vertex, else none) to "
+            "vertex (needs GOOGLE_CLOUD_PROJECT), ollama (needs OLLAMA_BASE_URL and OLLAMA_EMBEDDING_MODEL pulled) "
+            "or hashing (offline, no model)"
+        )
+        return
+    db = get_session_factory()()
+    try:
+        counts = _backfill(db, batch_size=args.batch_size)
+    finally:
+        db.close()
+    print(f"Embedded {counts['embedded']} chat messages ({counts['skipped']} skipped: blank or embedding failed)")
+
+
+def vector_index(args: argparse.Namespace) -> None:
+    from vector_index import ensure_vector_index
+
+    result = ensure_vector_index(get_engine(), rebuild=args.rebuild, concurrently=not args.blocking)
+    print(f"Chat vector index: {result}")
+
+
+def migrate(args: argparse.Namespace) -> None:
+    result = ensure_schema(get_engine(), mode="always" if args.force else "auto")
+    print(f"Schema: {result}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("backfill-scores", help="Store symptom/risk scores and status for check-ins missing them or on an old score_version")
+    p.add_argument("--batch-size", type=int, default=1000)
+    p.set_defaults(func=backfill_scores)
+
+    p = sub.add_parser("backfill-embeddings", help="Embed chat messages stored without an embedding")
+    p.add_argument("--batch-size", type=int, default=100)
+    p.set_defaults(func=backfill_embeddings)
+
+    p = sub.add_parser("vector-index", help="Create or rebuild the ANN index on chat_messages.embedding from CHAT_ANN_* settings")
+    p.add_argument("--rebuild", action="store_true", help="Rebuild even if the existing index matches the settings")
+    p.add_argument("--blocking", action="store_true", help="Build without CONCURRENTLY (faster, but blocks writes)")
+    p.set_defaults(func=vector_index)
+
+    p = sub.add_parser("migrate", help="Apply the schema DDL (extension, tables, migrations, ANN index) if it changed; for STARTUP_DDL=never")
+    p.add_argument("--force", action="store_true", help="Run the DDL even if the stored schema fingerprint is current")
+    p.set_defaults(func=migrate)
+
+    args = parser.parse_args()
+    if args.func is not migrate:
+        ensure_schema(get_engine(), mode="auto")
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+Request latency and per-stage timings: Prometheus text exposition (GET /metrics) and
+Server-Timing response headers.
+
+MetricsMiddleware times every request into http_request_duration_seconds{method,route,status}.
+Code inside a request marks stages with `with stage("embedding"):` (or @timed); each stage goes
+to app_stage_duration_seconds{stage} and, for stages finished before the response starts, to the
+request's Server-Timing header. Stages of a streamed body (generation in /chat/stream) only
+reach the histograms. A measurement is a few dict updates under a lock, cheap enough to leave on.
+
+Metrics are per process: with several workers or instances, scrape each one.
+"""
+import bisect
+import functools
+import inspect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from config import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# stage name -> [seconds, count] for the current request; None outside requests
+_request_stages: ContextVar[Optional[Dict[str, list]]] = ContextVar("request_stages", default=None)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(value: float) -> str:
+    return repr(float(value)) if value != float("inf") else "+Inf"
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        return "\n".join([f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self.samples()])
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_labels(self.labelnames, k)} {_num(v)}" for k, v in sorted(self._values.items())]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (non-cumulative, last = +Inf), sum, count]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        i = bisect.bisect_left(self.buckets, value)  # first bucket with value <= bound; len(buckets) = +Inf
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted((k, [list(v[0]), v[1], v[2]]) for k, v in self._values.items())
+        lines = []
+        for labels, (counts, total, count) in values:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = 'le="%s"' % _num(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_num(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class CallbackMetric(Metric):
+    """Gauge (or counter) read at scrape time from state kept elsewhere: fn returns {label values tuple: value}."""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str], fn: Callable[[], Dict[Tuple[str, ...], float]], kind: str = "gauge"):
+        super().__init__(name, help, labelnames)
+        self.fn = fn
+        self.kind = kind
+
+    def samples(self) -> List[str]:
+        try:
+            values = self.fn()
+        except Exception:
+            return []
+        return [f"{self.name}{_labels(self.labelnames, k)} {_num(v)}" for k, v in sorted(values.items())]
+
+
+_registry: Dict[str, Metric] = {}
+
+
+def register(metric: Metric) -> Metric:
+    """Add a metric to GET /metrics (re-registering a name replaces it)."""
+    _registry[metric.name] = metric
+    return metric
+
+
+def render() -> str:
+    """All registered metrics in Prometheus text format 0.0.4."""
+    return "\n".join(m.render() for m in list(_registry.values())) + "\n"
+
+
+request_duration = register(Histogram("http_request_duration_seconds", "HTTP request latency", ("method", "route", "status")))
+stage_duration = register(Histogram("app_stage_duration_seconds", "Time spent in a request stage (db session, embedding, vector search, LLM)", ("stage",)))
+
+
+def record_stage(name: str, seconds: float) -> None:
+    stage_duration.observe(seconds, name)
+    stages = _request_stages.get()
+    if stages is not None:
+        entry = stages.setdefault(name, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time the enclosed block as a stage of the current request (works in async code and worker threads)."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - t0)
+
+
+def timed(name: str):
+    """Decorator form of stage() for sync and async functions."""
+
+    def decorate(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                with stage(name):
+                    return await fn(*args, **kwargs)
+        else:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with stage(name):
+                    return fn(*args, **kwargs)
+        return wrapper
+
+    return decorate
+
+
+def _server_timing(stages: Dict[str, list], total: float) -> bytes:
+    parts = [f"{name};dur={seconds * 1000:.1f}" for name, (seconds, _) in list(stages.items())]
+    parts.append(f"app;dur={total * 1000:.1f}")
+    return ", ".join(parts).encode("latin-1")
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware (no response buffering, so streaming is unaffected)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.metrics_enabled:
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        stages: Dict[str, list] = {}
+        token = _request_stages.set(stages)
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                if settings.server_timing_enabled:
+                    headers = list(message.get("headers") or [])
+                    headers.append((b"server-timing", _server_timing(stages, time.perf_counter() - started)))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_stages.reset(token)
+            route = scope.get("route")
+            # Route templates keep the label set bounded; unmatched paths (404s, scans) share one label
+            path = getattr(route, "path", None) or "unmatched"
+            request_duration.observe(time.perf_counter() - started, scope.get("method", ""), path, str(status[0]))
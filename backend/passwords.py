@@ -0,0 +1,120 @@
+"""
+bcrypt hashing and verification in a dedicated, size-limited process pool, plus per-email
+login attempt throttling.
+
+bcrypt is pure CPU for tens of milliseconds per call; running it in worker processes keeps it
+off the event loop and out of the shared thread pool, and the limiter bounds how many calls
+wait for a worker (PASSWORD_MAX_QUEUE, PASSWORD_QUEUE_TIMEOUT) so a login burst is answered
+with 503 instead of growing latency for everyone.
+"""
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from passlib.context import CryptContext
+
+from cache import TTLCache
+from config import settings
+from limits import BusyError, ConcurrencyLimiter
+
+pwd_ctx = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+class PasswordBusyError(BusyError):
+    """No password hashing worker became free in time."""
+
+
+def _hash(password: str) -> str:
+    return pwd_ctx.hash(password)
+
+
+def _verify(password: str, hashed: str) -> bool:
+    return pwd_ctx.verify(password, hashed)
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_limiter: Optional[ConcurrencyLimiter] = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: workers start clean instead of forking a process that runs threads and an event loop
+        _pool = ProcessPoolExecutor(max_workers=max(1, settings.password_workers), mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def _get_limiter() -> ConcurrencyLimiter:
+    global _limiter
+    if _limiter is None:
+        _limiter = ConcurrencyLimiter(
+            settings.password_workers,
+            settings.password_max_queue,
+            settings.password_queue_timeout,
+            error=PasswordBusyError,
+            label="password hashing",
+        )
+    return _limiter
+
+
+async def _run(fn, *args):
+    global _pool
+    async with _get_limiter().slot():
+        pool = _get_pool()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM-killed): shut the broken pool down (reaping its remaining
+            # workers) and start a fresh one on the next call. Only the first of several concurrent
+            # failures does this, so a pool another caller has already replaced is kept.
+            if _pool is pool:
+                _pool = None
+                pool.shutdown(wait=False, cancel_futures=True)
+            raise
+
+
+async def hash_password(password: str) -> str:
+    return await _run(_hash, password)
+
+
+async def verify_password(password: str, hashed: str) -> bool:
+    return await _run(_verify, password, hashed)
+
+
+def shutdown_password_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+class LoginThrottle:
+    """At most max_attempts unsuccessful login attempts per email within window seconds."""
+
+    def __init__(self, max_attempts: int, window: float, max_emails: int = 100_000):
+        self.max_attempts = max_attempts
+        self.window = window
+        self._attempts = TTLCache(max_emails, ttl=window)
+        self._lock = threading.Lock()
+
+    def check(self, email: str) -> Optional[float]:
+        """Record an attempt. Returns seconds to wait when the email is over its limit, else None."""
+        key = email.strip().lower()
+        now = time.monotonic()
+        with self._lock:
+            recent = [t for t in (self._attempts.get(key) or []) if now - t < self.window]
+            if len(recent) >= self.max_attempts:
+                return self.window - (now - recent[0])
+            self._attempts.put(key, recent + [now])
+        return None
+
+    def reset(self, email: str) -> None:
+        """Successful login: forget the email's attempts."""
+        self._attempts.pop(email.strip().lower())
+
+
+login_throttle = LoginThrottle(settings.login_max_attempts, settings.login_attempt_window)
@@ -1,12 +1,44 @@
 """RAG chat implementation: Ollama (local) and Vertex AI (cloud)."""
+import json
+import time
+from collections.abc import AsyncIterator
 from typing import List, Optional
 
 import httpx
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from cache import TTLCache, get_data_version
 from config import settings
-from database import CheckIn, Conversation, Patient, DbSession
+from context_builder import chat_section, estimate_tokens, fit_history, messages_tokens, patient_section
+from database import CheckIn, Patient
 from database import ChatMessage as ChatMessageModel
 from embeddings import get_embedding
+from limits import BusyError, ConcurrencyLimiter
+from metrics import CallbackMetric, record_stage, register, stage, timed
+from scores import check_ins_to_response
+from vector_index import apply_search_settings
+
+SYSTEM_PROMPT = """You are a helpful health assistant. Answer questions based on the patient's health data provided in the context.
+Be empathetic, clear, and professional. If the context doesn't contain relevant information, say so politely.
+Do not make medical diagnoses or provide treatment advice beyond general wellness guidance."""
+
+
+# Query-independent context per (user_id, shared data version); new check-ins bump the version
+_patient_context_cache = TTLCache(settings.rag_context_cache_size, ttl=settings.rag_context_cache_ttl)
+
+
+def rag_context_cache_stats() -> dict:
+    return _patient_context_cache.stats()
+
+
+class LLMBusyError(BusyError):
+    """No generation slot became free in time (model overloaded)."""
+
+
+class LLMError(Exception):
+    """The model provider failed; the message is shown to the user in place of an answer."""
 
 
 class RAGChat:
@@ -14,6 +46,10 @@ class RAGChat:
     
     def __init__(self):
         self.provider = settings.llm_provider.lower()
+        self.limiter = ConcurrencyLimiter(
+            settings.llm_max_in_flight, settings.llm_max_queue, settings.llm_queue_timeout, error=LLMBusyError, label="model"
+        )
+        self._http: Optional[httpx.AsyncClient] = None
         if self.provider == "vertex":
             self._init_vertex()
         elif self.provider == "ollama":
@@ -25,6 +61,24 @@ class RAGChat:
         """Ollama: use HTTP API (no ollama package to avoid httpx conflict)."""
         self.ollama_base_url = settings.ollama_base_url.rstrip("/")
         self.ollama_model = settings.ollama_model
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        """Long-lived pooled client (keep-alive to Ollama); created on first use inside the event loop."""
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=settings.ollama_max_connections,
+                    max_keepalive_connections=settings.ollama_max_keepalive,
+                ),
+                timeout=httpx.Timeout(settings.llm_read_timeout, connect=settings.llm_connect_timeout),
+            )
+        return self._http
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
     
     def _init_vertex(self):
         """Initialize Vertex AI client."""
@@ -40,98 +94,172 @@ class RAGChat:
         except ImportError:
             raise ImportError("google-cloud-aiplatform not installed. Run: pip install google-cloud-aiplatform")
     
-    def _retrieve_context(self, query: str, user_id: str, db: DbSession) -> str:
-        """Retrieve relevant context from patient check-ins, notes, and past chat (vector search)."""
-        context_parts = []
-
-        # Patient info and check-ins
-        patient = db.query(Patient).filter(Patient.id == user_id).first()
-        if patient:
-            context_parts.append(f"Patient: {patient.name}, Age: {patient.age}, Condition: {patient.condition}")
-            check_ins = db.query(CheckIn).filter(CheckIn.patient_id == user_id).order_by(CheckIn.date.desc()).limit(10).all()
-            for ci in check_ins:
-                symptoms = []
-                if ci.fatigue > 0:
-                    symptoms.append(f"fatigue ({ci.fatigue:.1f})")
-                if ci.breathlessness > 0:
-                    symptoms.append(f"breathlessness ({ci.breathlessness:.1f})")
-                if ci.cough > 0:
-                    symptoms.append(f"cough ({ci.cough:.1f})")
-                if ci.pain > 0:
-                    symptoms.append(f"pain ({ci.pain:.1f})")
-                if ci.notes:
-                    symptoms.append(f"notes: {ci.notes}")
-                if symptoms:
-                    date_str = ci.date.strftime("%Y-%m-%d") if ci.date else "unknown"
-                    context_parts.append(f"Check-in {date_str}: {', '.join(symptoms)}")
+    async def _patient_context(self, user_id: str, db: AsyncSession) -> str:
+        """Patient summary, trends and recent check-in table (the query-independent part of the context)."""
+        patient = await db.get(Patient, user_id)
+        if not patient:
+            return ""
+        check_ins = (
+            await db.scalars(
+                select(CheckIn).where(CheckIn.patient_id == user_id).order_by(CheckIn.date.desc()).limit(settings.rag_context_check_ins)
+            )
+        ).all()
+        return patient_section(patient, check_ins_to_response(check_ins), settings.rag_patient_token_budget)
+
+    async def retrieve_context(self, query: str, user_id: str, db: AsyncSession, read_db: Optional[AsyncSession] = None) -> str:
+        """Retrieve relevant context from patient check-ins, notes, and past chat (vector search).
+        With read_db (a replica session) the vector search runs there. Patient data and its version
+        are read from db, so a cached context is only reused while the primary shows no newer write."""
+        # Patient info and check-ins: cached until the patient's data version (data_versions table,
+        # bumped by every instance's writes) changes; one primary-key lookup instead of the context queries
+        key = (user_id, await get_data_version(db, user_id))
+        patient_text = _patient_context_cache.get(key)
+        if patient_text is None:
+            with stage("rag_patient_context"):
+                patient_text = await self._patient_context(user_id, db)
+            _patient_context_cache.put(key, patient_text)
+        context_parts = [patient_text] if patient_text else []
+        chat_budget = settings.rag_context_token_budget - estimate_tokens(patient_text)
 
         # Vector search over past chat messages (when embeddings available)
-        query_embedding = get_embedding(query)
-        if query_embedding:
+        query_embedding = await run_in_threadpool(get_embedding, query)
+        if query_embedding and chat_budget > 0:
             limit = getattr(settings, "chat_vector_search_limit", 5) or 5
+            distance = ChatMessageModel.embedding.cosine_distance(query_embedding).label("distance")
+            candidates = (
+                select(ChatMessageModel.role, ChatMessageModel.content, distance)
+                .where(ChatMessageModel.user_id == user_id)
+                .where(ChatMessageModel.embedding.isnot(None))
+                .order_by(distance)
+                .limit(limit)
+                .subquery()
+            )
             try:
-                nearest = (
-                    db.query(ChatMessageModel)
-                    .join(Conversation, Conversation.id == ChatMessageModel.conversation_id)
-                    .filter(Conversation.user_id == user_id)
-                    .filter(ChatMessageModel.embedding.isnot(None))
-                    .order_by(ChatMessageModel.embedding.cosine_distance(query_embedding))
-                    .limit(limit)
-                    .all()
-                )
+                # Savepoint: a failed ANN query must not abort the caller's transaction
+                with stage("vector_search"):
+                    search_db = read_db if read_db is not None else db
+                    async with search_db.begin_nested():
+                        await apply_search_settings(search_db)
+                        # Iterative index scans may return candidates slightly out of order; re-sort them
+                        nearest = (
+                            await search_db.execute(
+                                select(candidates.c.role, candidates.c.content).order_by(candidates.c.distance)
+                            )
+                        ).all()
             except Exception:
                 nearest = []
-            for msg in nearest:
-                context_parts.append(f"Past chat ({msg.role}): {msg.content[:500]}{'...' if len(msg.content or '') > 500 else ''}")
+            chats = chat_section(nearest, chat_budget)
+            if chats:
+                context_parts.append(chats)
 
         return "\n".join(context_parts) if context_parts else "No recent check-in or chat data available."
     
-    def chat(self, query: str, user_id: str, db: DbSession, conversation_history: Optional[List[dict]] = None) -> str:
+    async def generate(self, query: str, context: str, conversation_history: Optional[List[dict]] = None) -> str:
+        """Generate a response from already-retrieved context (no DB access).
+        Waits for a limiter slot; raises LLMBusyError when the model is overloaded and LLMError when the provider fails."""
+        queued = time.perf_counter()
+        async with self.limiter.slot():
+            record_stage("llm_queue", time.perf_counter() - queued)
+            if self.provider == "ollama":
+                return await self._chat_ollama(query, context, SYSTEM_PROMPT, conversation_history)
+            else:
+                return await self._chat_vertex(query, context, SYSTEM_PROMPT, conversation_history)
+
+    async def chat(self, query: str, user_id: str, db: AsyncSession, conversation_history: Optional[List[dict]] = None) -> str:
         """Generate RAG response using retrieved context."""
-        context = self._retrieve_context(query, user_id, db)
-        
-        system_prompt = """You are a helpful health assistant. Answer questions based on the patient's health data provided in the context.
-Be empathetic, clear, and professional. If the context doesn't contain relevant information, say so politely.
-Do not make medical diagnoses or provide treatment advice beyond general wellness guidance."""
-        
-        if self.provider == "ollama":
-            return self._chat_ollama(query, context, system_prompt, conversation_history)
-        else:
-            return self._chat_vertex(query, context, system_prompt, conversation_history)
+        context = await self.retrieve_context(query, user_id, db)
+        return await self.generate(query, context, conversation_history)
     
-    def _chat_ollama(self, query: str, context: str, system_prompt: str, history: Optional[List[dict]]) -> str:
-        """Chat using Ollama HTTP API."""
+    def _ollama_messages(self, query: str, context: str, system_prompt: str, history: Optional[List[dict]]) -> List[dict]:
         messages = [{"role": "system", "content": system_prompt}]
         
-        if history:
-            messages.extend(history[-5:])  # Last 5 messages for context
+        # Newest turns that fit the history budget (replaces a fixed last-5 window)
+        messages.extend(fit_history(history, settings.rag_history_token_budget))
         
         messages.append({
             "role": "user",
             "content": f"Context about patient's health:\n{context}\n\nUser question: {query}"
         })
-        
+        return messages
+
+    def prompt_tokens(self, query: str, context: str, history: Optional[List[dict]] = None) -> int:
+        """Estimated size of the prompt generate() sends for these inputs."""
+        if self.provider == "ollama":
+            return messages_tokens(self._ollama_messages(query, context, SYSTEM_PROMPT, history))
+        return estimate_tokens(self._vertex_prompt(query, context, SYSTEM_PROMPT)[0])
+
+    def _vertex_prompt(self, query: str, context: str, system_prompt: str) -> List[str]:
+        return [f"{system_prompt}\n\nContext:\n{context}\n\nUser: {query}\n\nAssistant:"]
+
+    @timed("llm_generate")
+    async def _chat_ollama(self, query: str, context: str, system_prompt: str, history: Optional[List[dict]]) -> str:
+        """Chat using Ollama HTTP API."""
         url = f"{self.ollama_base_url}/api/chat"
-        payload = {"model": self.ollama_model, "messages": messages}
+        payload = {"model": self.ollama_model, "messages": self._ollama_messages(query, context, system_prompt, history), "stream": False}
         
         try:
-            with httpx.Client(timeout=120.0) as client:
-                r = client.post(url, json=payload)
-                r.raise_for_status()
-                data = r.json()
-                return data.get("message", {}).get("content", "No response.")
+            r = await self.http.post(url, json=payload)
+            r.raise_for_status()
+            data = r.json()
+            return data.get("message", {}).get("content", "No response.")
         except Exception as e:
-            return f"Error calling Ollama: {str(e)}. Make sure Ollama is running at {settings.ollama_base_url}"
+            raise LLMError(f"Error calling Ollama: {str(e)}. Make sure Ollama is running at {settings.ollama_base_url}") from e
     
-    def _chat_vertex(self, query: str, context: str, system_prompt: str, history: Optional[List[dict]]) -> str:
+    @timed("llm_generate")
+    async def _chat_vertex(self, query: str, context: str, system_prompt: str, history: Optional[List[dict]]) -> str:
         """Chat using Vertex AI Gemini."""
-        prompt_parts = [f"{system_prompt}\n\nContext:\n{context}\n\nUser: {query}\n\nAssistant:"]
-        
         try:
-            response = self.model.generate_content(prompt_parts)
+            response = await self.model.generate_content_async(self._vertex_prompt(query, context, system_prompt))
             return response.text if response.text else "No response generated."
         except Exception as e:
-            return f"Error calling Vertex AI: {str(e)}"
+            raise LLMError(f"Error calling Vertex AI: {str(e)}") from e
+
+    async def generate_stream(self, query: str, context: str, conversation_history: Optional[List[dict]] = None) -> AsyncIterator[str]:
+        """Like generate, but yields text chunks as the model produces them. Does not take a
+        limiter slot itself: the caller takes one around the stream (see routes.chat_stream), after
+        checking admission so a full queue is a 503 before the response starts. Raises LLMError (possibly after some chunks) when the provider fails."""
+        if self.provider == "ollama":
+            stream = self._stream_ollama(query, context, SYSTEM_PROMPT, conversation_history)
+        else:
+            stream = self._stream_vertex(query, context, SYSTEM_PROMPT, conversation_history)
+        with stage("llm_stream"):
+            async for chunk in stream:
+                yield chunk
+
+    async def _stream_ollama(self, query: str, context: str, system_prompt: str, history: Optional[List[dict]]) -> AsyncIterator[str]:
+        """Ollama /api/chat with stream=true: one JSON object per line until done."""
+        url = f"{self.ollama_base_url}/api/chat"
+        payload = {"model": self.ollama_model, "messages": self._ollama_messages(query, context, system_prompt, history), "stream": True}
+        try:
+            async with self.http.stream("POST", url, json=payload) as r:
+                r.raise_for_status()
+                async for line in r.aiter_lines():
+                    if not line.strip():
+                        continue
+                    data = json.loads(line)
+                    if data.get("error"):
+                        raise RuntimeError(data["error"])
+                    chunk = data.get("message", {}).get("content", "")
+                    if chunk:
+                        yield chunk
+                    if data.get("done"):
+                        break
+        except Exception as e:
+            raise LLMError(f"Error calling Ollama: {str(e)}. Make sure Ollama is running at {settings.ollama_base_url}") from e
+
+    async def _stream_vertex(self, query: str, context: str, system_prompt: str, history: Optional[List[dict]]) -> AsyncIterator[str]:
+        """Vertex AI Gemini with stream=True."""
+        try:
+            responses = await self.model.generate_content_async(self._vertex_prompt(query, context, system_prompt), stream=True)
+            async for response in responses:
+                try:
+                    text = response.text
+                except ValueError:
+                    continue  # e.g. final chunk with only finish_reason / safety data
+                if text:
+                    yield text
+        except Exception as e:
+            raise LLMError(f"Error calling Vertex AI: {str(e)}") from e
 
 
 def get_rag_chat() -> RAGChat:
@@ -139,3 +267,24 @@ def get_rag_chat() -> RAGChat:
     if not hasattr(get_rag_chat, "_instance"):
         get_rag_chat._instance = RAGChat()
     return get_rag_chat._instance
+
+
+def _llm_slots() -> dict:
+    if not hasattr(get_rag_chat, "_instance"):
+        return {}
+    limiter = get_rag_chat._instance.limiter
+    return {("in_flight",): limiter.in_flight, ("waiting",): limiter.waiting, ("max_in_flight",): limiter.max_in_flight}
+
+
+def _llm_rejected() -> dict:
+    return {(): get_rag_chat._instance.limiter.rejected} if hasattr(get_rag_chat, "_instance") else {}
+
+
+register(CallbackMetric("app_llm_slots", "LLM generation slots in use, callers waiting for one, and the limit", ("state",), _llm_slots))
+register(CallbackMetric("app_llm_rejected_total", "Generations refused with 503 (queue full or wait timed out)", (), _llm_rejected, kind="counter"))
+
+
+async def close_rag_chat() -> None:
+    """Close the shared HTTP client (app shutdown)."""
+    if hasattr(get_rag_chat, "_instance"):
+        await get_rag_chat._instance.aclose()
@@ -1,182 +1,710 @@
 """All API routes. Auth required except /health and /seed."""
+import base64
+import csv
+import hashlib
+import io
 import json
 import uuid
-from datetime import datetime
+from datetime import date, datetime, time, timedelta, timezone
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Response, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials
+from pydantic import ValidationError
+from sqlalchemy import func, insert, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
+
+from answer_cache import answer_cache_stats, lookup_answer, remember_answer
+from auth import auth_cache_stats, create_access_token, decode_token, get_current_user, revoke_token, security
+from cache import GLOBAL_SCOPE, get_data_version, mark_patients_changed
+from config import settings
+from database import (
+    AsyncDbSession,
+    AsyncReadDbSession,
+    CheckIn,
+    ChatMessage as ChatMessageModel,
+    Conversation,
+    Patient,
+    User,
+    get_async_read_session_factory,
+    get_async_session_factory,
+    read_replica_enabled,
+)
+from embedding_worker import get_embedding_worker
+from embeddings import embedding_cache_stats
+from metrics import stage
+from passwords import PasswordBusyError, hash_password, login_throttle, verify_password
+from rag import LLMBusyError, LLMError, RAGChat, get_rag_chat, rag_context_cache_stats
+from schemas import AuthResponse, AuthUser, ChatRequest, ChatResponse, ChatMessageOut, CheckInBatchCreate, CheckInBatchItemOut, CheckInBatchOut, CheckInCreate, CheckInWithScoresOut, ConversationHistoryOut, DashboardAnalyticsOut, DashboardDayOut, DashboardLatestOut, LoginBody, PatientOut, Token, UserCreate
+from scores import RESPONSE_FIELDS, SCORE_VERSION, SYMPTOM_KEYS, apply_scores, check_in_to_response, check_ins_to_columns, check_ins_to_response, columns_for_fields, risk_score_expr, score_batch, status_expr, stored_or_computed, symptom_score_expr
+
+try:
+    import orjson  # noqa: F401  (optional: faster list encoding)
+
+    _FastJSONResponse = ORJSONResponse
+except ImportError:
+    _FastJSONResponse = JSONResponse
 
-from auth import create_access_token, get_current_user, pwd_ctx
-from database import CheckIn, ChatMessage as ChatMessageModel, Conversation, Patient, User, DbSession
-from embeddings import get_embedding
-from rag import get_rag_chat
-from schemas import AuthResponse, AuthUser, ChatRequest, ChatResponse, ChatMessageOut, CheckInCreate, CheckInWithScoresOut, ConversationHistoryOut, LoginBody, PatientOut, Token, UserCreate
-from scores import check_in_to_response
 
 router = APIRouter()
 
 
 @router.get("/health")
-def health():
+async def health():
     return {"status": "ok"}
 
 
+@router.get("/cache/stats")
+async def cache_stats(current: AuthUser = Depends(get_current_user)):
+    """Size and hit rate of the in-process caches (this instance only)."""
+    return {
+        "auth": auth_cache_stats(),
+        "rag_context": rag_context_cache_stats(),
+        "embeddings": embedding_cache_stats(),
+        "answers": answer_cache_stats(),
+    }
+
+
 # ---- Auth ----
+async def _password_call(call):
+    """Await a passwords.* coroutine; bcrypt workers saturated -> 503 instead of an ever-longer wait."""
+    try:
+        return await call
+    except PasswordBusyError as e:
+        raise HTTPException(status_code=503, detail=f"Sign-in is busy, try again shortly: {e}", headers={"Retry-After": "2"})
+
+
 @router.post("/auth/register", status_code=status.HTTP_204_NO_CONTENT)
-def register(body: UserCreate, db: DbSession):
-    if db.query(User).filter(User.email == body.email).first():
+async def register(body: UserCreate, db: AsyncDbSession):
+    if await db.scalar(select(User.id).where(User.email == body.email)):
         raise HTTPException(status_code=400, detail="Email already registered")
     role = "patient" if body.role != "admin" else "admin"
     uid = str(uuid.uuid4())
-    db.add(User(id=uid, email=body.email, hashed_password=pwd_ctx.hash(body.password), role=role))
+    hashed = await _password_call(hash_password(body.password))
+    db.add(User(id=uid, email=body.email, hashed_password=hashed, role=role))
     if role == "patient":
         name = (body.name or body.email or "Patient").strip() or "Patient"
         db.add(Patient(id=uid, name=name, age=0, condition=""))
+        mark_patients_changed(db, [uid])
     return Response(status_code=204)
 
 
 @router.post("/auth/login", response_model=AuthResponse)
-def login(body: LoginBody, db: DbSession):
+async def login(body: LoginBody, db: AsyncDbSession):
     """If user exists: verify password and return token. If not: register then return token (one-step sign-in)."""
-    user = db.query(User).filter(User.email == body.email).first()
+    wait = login_throttle.check(body.email)
+    if wait is not None:
+        raise HTTPException(
+            status_code=429, detail="Too many login attempts for this account, try again later", headers={"Retry-After": str(max(1, int(wait)))}
+        )
+    user = await db.scalar(select(User).where(User.email == body.email))
     if user:
-        if not pwd_ctx.verify(body.password, user.hashed_password):
+        if not await _password_call(verify_password(body.password, user.hashed_password)):
             raise HTTPException(status_code=401, detail="Invalid credentials")
     else:
         # User does not exist: register (user + patient if role=patient) then treat as logged in
         uid = str(uuid.uuid4())
         role = "admin" if body.role == "admin" else "patient"
-        db.add(User(id=uid, email=body.email, hashed_password=pwd_ctx.hash(body.password), role=role))
+        hashed = await _password_call(hash_password(body.password))
+        user = User(id=uid, email=body.email, hashed_password=hashed, role=role)
+        db.add(user)
         if role == "patient":
             name = (body.email or "Patient").strip() or "Patient"
             db.add(Patient(id=uid, name=name, age=0, condition=""))
-        db.flush()
-        user = db.query(User).filter(User.id == uid).first()
+            mark_patients_changed(db, [uid])
+        await db.flush()
+    login_throttle.reset(body.email)
     return AuthResponse(
-        token=Token(access_token=create_access_token(user.id), token_type="bearer"),
+        token=Token(access_token=create_access_token(user.id, user.email, user.role), token_type="bearer"),
         user=AuthUser(id=user.id, email=user.email, role=user.role),
     )
 
 
+@router.post("/auth/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)):
+    """Revoke the presented token (this instance; it stays rejected until it would have expired)."""
+    if not credentials or not credentials.credentials:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    revoke_token(decode_token(credentials.credentials))
+    return Response(status_code=204)
+
+
 @router.get("/auth/me", response_model=AuthUser)
-def me(current: AuthUser = Depends(get_current_user)):
+async def me(current: AuthUser = Depends(get_current_user)):
     return current
 
 
+# ---- Conditional GET ----
+async def _etag(request: Request, db: AsyncSession, scope: str, *extra) -> Optional[str]:
+    """Weak ETag from the shared data version of scope (a patient id or GLOBAL_SCOPE), read from db
+    (the session that serves the data); None when ETAG_ENABLED is off. Called before the list query,
+    so a write that lands during the query changes the next ETag. The path and normalized query
+    string are hashed in, so each representation (page, window, format, fields) gets its own tag."""
+    if not settings.etag_enabled:
+        return None
+    version = await get_data_version(db, scope)
+    query = sorted(request.query_params.multi_items())
+    representation = hashlib.blake2b(repr((request.url.path, query)).encode(), digest_size=8).hexdigest()
+    return 'W/"%s"' % ".".join([str(version), representation, *map(str, extra)])
+
+
+def _etag_headers(etag: Optional[str]) -> dict:
+    # no-cache: browsers keep the body but revalidate (If-None-Match) on every fetch
+    return {"ETag": etag, "Cache-Control": "private, no-cache"} if etag else {}
+
+
+def _not_modified(request: Request, etag: Optional[str]) -> Optional[Response]:
+    """304 when If-None-Match lists this ETag (weak comparison), so the list query and serialization are skipped."""
+    header = request.headers.get("if-none-match")
+    if not etag or not header:
+        return None
+    opaque = etag.removeprefix("W/")
+    if header.strip() == "*" or any(t.strip().removeprefix("W/") == opaque for t in header.split(",")):
+        return Response(status_code=304, headers=_etag_headers(etag))
+    return None
+
+
 # ---- Patients ----
 @router.get("/patients", response_model=List[PatientOut])
-def list_patients(db: DbSession, current: AuthUser = Depends(get_current_user)):
-    rows = db.query(Patient).order_by(Patient.created_at.desc()).all()
+async def list_patients(request: Request, response: Response, db: AsyncReadDbSession, current: AuthUser = Depends(get_current_user)):
+    etag = await _etag(request, db, GLOBAL_SCOPE)
+    if (not_modified := _not_modified(request, etag)) is not None:
+        return not_modified
+    response.headers.update(_etag_headers(etag))
+    rows = (await db.scalars(select(Patient).order_by(Patient.created_at.desc()))).all()
     return [PatientOut(id=r.id, name=r.name, age=r.age, condition=r.condition, created_at=(r.created_at.isoformat() if r.created_at else "")) for r in rows]
 
 
 @router.get("/patients/{patient_id}", response_model=PatientOut)
-def get_patient(patient_id: str, db: DbSession, current: AuthUser = Depends(get_current_user)):
-    r = db.query(Patient).filter(Patient.id == patient_id).first()
+async def get_patient(patient_id: str, request: Request, response: Response, db: AsyncReadDbSession, current: AuthUser = Depends(get_current_user)):
+    etag = await _etag(request, db, patient_id)
+    if (not_modified := _not_modified(request, etag)) is not None:
+        return not_modified
+    r = await db.get(Patient, patient_id)
     if not r:
         raise HTTPException(status_code=404, detail="Patient not found")
+    response.headers.update(_etag_headers(etag))
     return PatientOut(id=r.id, name=r.name, age=r.age, condition=r.condition, created_at=(r.created_at.isoformat() if r.created_at else ""))
 
 
 # ---- Check-ins ----
-@router.get("/check-ins", response_model=List[CheckInWithScoresOut])
-def list_check_ins(db: DbSession, patient_id: Optional[str] = None, current: AuthUser = Depends(get_current_user)):
-    q = db.query(CheckIn)
+def _encode_cursor(row: CheckIn) -> str:
+    raw = json.dumps([row.date.isoformat(), row.id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        date_str, cid = json.loads(raw)
+        return datetime.fromisoformat(date_str), str(cid)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _parse_date_param(value: str, name: str) -> tuple[datetime, bool]:
+    """Parse an ISO date or datetime query param. Returns (datetime, date_only); naive values are UTC."""
+    try:
+        if len(value) == 10:
+            return datetime.combine(date.fromisoformat(value), time.min, tzinfo=timezone.utc), True
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name}: expected ISO date or datetime")
+    return (dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)), False
+
+
+def _check_in_filters(patient_id: Optional[str], since: Optional[str], until: Optional[str], status_filter: Optional[str]) -> list:
+    conds = []
     if patient_id:
-        q = q.filter(CheckIn.patient_id == patient_id)
-    return [CheckInWithScoresOut(**check_in_to_response(r)) for r in q.order_by(CheckIn.date.desc()).all()]
+        conds.append(CheckIn.patient_id == patient_id)
+    if since:
+        conds.append(CheckIn.date >= _parse_date_param(since, "since")[0])
+    if until:
+        until_dt, date_only = _parse_date_param(until, "until")
+        conds.append(CheckIn.date < until_dt + timedelta(days=1) if date_only else CheckIn.date <= until_dt)
+    if status_filter:
+        # Stored column (ix_check_ins_status_date); rows must be scored at write time or backfilled
+        conds.append(CheckIn.status == status_filter)
+    return conds
+
+
+def _parse_fields(fields: Optional[str]) -> tuple:
+    if not fields:
+        return RESPONSE_FIELDS
+    names = tuple(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    unknown = [f for f in names if f not in RESPONSE_FIELDS]
+    if unknown or not names:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown) or fields}")
+    return names
+
+
+@router.get("/check-ins", response_model=List[CheckInWithScoresOut])
+async def list_check_ins(
+    request: Request,
+    db: AsyncReadDbSession,
+    patient_id: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    status_filter: Optional[str] = Query(None, alias="status"),
+    fmt: str = Query("rows", alias="format", pattern="^(rows|columnar)$"),
+    fields: Optional[str] = None,
+    current: AuthUser = Depends(get_current_user),
+):
+    """Newest first. since/until are inclusive (a date-only until covers that whole day).
+    With limit, the next page's opaque cursor is returned in the X-Next-Cursor header.
+    format=columnar returns {field: [values, newest first]} for the comma-separated fields (default all)."""
+    if fields and fmt != "columnar":
+        raise HTTPException(status_code=400, detail="fields requires format=columnar")
+    names = _parse_fields(fields) if fmt == "columnar" else RESPONSE_FIELDS
+    etag = await _etag(request, db, patient_id or GLOBAL_SCOPE)
+    if (not_modified := _not_modified(request, etag)) is not None:
+        return not_modified
+    q = select(CheckIn).where(*_check_in_filters(patient_id, since, until, status_filter))
+    if names != RESPONSE_FIELDS:
+        q = q.options(load_only(*(getattr(CheckIn, c) for c in columns_for_fields(names))))
+    if cursor:
+        q = q.where(tuple_(CheckIn.date, CheckIn.id) < tuple_(*_decode_cursor(cursor)))
+    # Matches ix_check_ins_patient_id_date_id so the window is read in index order (no sort)
+    q = q.order_by(CheckIn.date.desc(), CheckIn.id.desc())
+    if limit is not None:
+        q = q.limit(limit + 1)
+    rows = (await db.scalars(q)).all()
+    headers = _etag_headers(etag)
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = _encode_cursor(rows[-1])
+
+    # Scoring/serialising a long list is CPU work: run it off the event loop. The dicts already
+    # match CheckInWithScoresOut, so they are encoded directly (response_model is for the docs).
+    def render() -> Response:
+        if fmt == "columnar":
+            return _FastJSONResponse(check_ins_to_columns(rows, names), headers=headers)
+        return _FastJSONResponse(check_ins_to_response(rows), headers=headers)
+
+    return await run_in_threadpool(render)
+
+
+EXPORT_FIELDS = tuple(CheckInWithScoresOut.model_fields)
+EXPORT_BATCH_SIZE = 1000
+
+
+async def _export_rows(conds: list):
+    """Yield batches of response dicts from a server-side cursor. Owns its session: the
+    request's get_async_db session is closed before a StreamingResponse body is sent."""
+    async with get_async_read_session_factory()() as db:
+        stmt = (
+            select(CheckIn)
+            .where(*conds)
+            .order_by(CheckIn.date.desc(), CheckIn.id.desc())
+            .execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        result = await db.stream_scalars(stmt)
+        async for batch in result.partitions():
+            yield await run_in_threadpool(check_ins_to_response, batch)
+
+
+def _ndjson_chunk(batch: list[dict]) -> str:
+    return "".join(json.dumps(d) + "\n" for d in batch)
+
+
+def _csv_chunk(batch: list[dict]) -> str:
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=EXPORT_FIELDS)
+    for d in batch:
+        writer.writerow({**d, "devices": json.dumps(d["devices"]) if d["devices"] is not None else ""})
+    return buf.getvalue()
+
+
+async def _export_ndjson(conds: list):
+    async for batch in _export_rows(conds):
+        yield await run_in_threadpool(_ndjson_chunk, batch)
+
+
+async def _export_csv(conds: list):
+    yield ",".join(EXPORT_FIELDS) + "\r\n"
+    async for batch in _export_rows(conds):
+        yield await run_in_threadpool(_csv_chunk, batch)
+
+
+@router.get("/check-ins/export")
+async def export_check_ins(
+    fmt: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    patient_id: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    status_filter: Optional[str] = Query(None, alias="status"),
+    current: AuthUser = Depends(get_current_user),
+):
+    """Stream check-ins (with scores) as NDJSON or CSV, newest first; memory stays bounded by the batch size."""
+    conds = _check_in_filters(patient_id, since, until, status_filter)
+    if fmt == "csv":
+        body, media_type = _export_csv(conds), "text/csv"
+    else:
+        body, media_type = _export_ndjson(conds), "application/x-ndjson"
+    return StreamingResponse(body, media_type=media_type, headers={"Content-Disposition": f'attachment; filename="check-ins.{fmt}"'})
+
+
+def _check_in_values(body: CheckInCreate, dt: datetime) -> dict:
+    """Column values for a new check-in row (without scores)."""
+    return {
+        "id": str(uuid.uuid4()),
+        "patient_id": body.patient_id,
+        "date": dt,
+        **body.model_dump(include=set(SYMPTOM_KEYS) | {"sleep_hours", "meds_taken", "appetite", "mobility", "notes"}),
+        "devices": json.dumps(body.devices.model_dump(exclude_none=True)) if body.devices else None,
+    }
 
 
 @router.post("/check-ins", response_model=CheckInWithScoresOut)
-def create_check_in(body: CheckInCreate, db: DbSession, current: AuthUser = Depends(get_current_user)):
-    if not db.query(Patient).filter(Patient.id == body.patient_id).first():
+async def create_check_in(body: CheckInCreate, db: AsyncDbSession, current: AuthUser = Depends(get_current_user)):
+    if not await db.get(Patient, body.patient_id):
         raise HTTPException(status_code=404, detail="Patient not found")
     try:
         dt = datetime.fromisoformat(body.date.replace("Z", "+00:00"))
     except (ValueError, TypeError):
         dt = datetime.utcnow()
-    cid = str(uuid.uuid4())
-    dev = json.dumps(body.devices.model_dump(exclude_none=True)) if body.devices else None
-    row = CheckIn(
-        id=cid, patient_id=body.patient_id, date=dt,
-        fatigue=body.fatigue, breathlessness=body.breathlessness, cough=body.cough, pain=body.pain,
-        nausea=body.nausea, dizziness=body.dizziness, swelling=body.swelling, anxiety=body.anxiety,
-        headache=body.headache, chest_tightness=body.chest_tightness, joint_stiffness=body.joint_stiffness,
-        skin_issues=body.skin_issues, constipation=body.constipation, bloating=body.bloating,
-        sleep_hours=body.sleep_hours, meds_taken=body.meds_taken, appetite=body.appetite, mobility=body.mobility,
-        devices=dev, notes=body.notes,
-    )
+    row = CheckIn(**_check_in_values(body, dt))
+    apply_scores(row)
     db.add(row)
-    db.flush()
+    await db.flush()
+    mark_patients_changed(db, [row.patient_id])
     return CheckInWithScoresOut(**check_in_to_response(row))
 
 
+def _validation_message(e: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, err['loc'])) or 'item'}: {err['msg']}" for err in e.errors())
+
+
+@router.post("/check-ins/batch", response_model=CheckInBatchOut)
+async def create_check_ins_batch(body: CheckInBatchCreate, db: AsyncDbSession, current: AuthUser = Depends(get_current_user)):
+    """Bulk ingest (e.g. device gateways). One patient lookup and one multi-row INSERT;
+    invalid items are reported per index and the rest are still stored."""
+    results: list[Optional[CheckInBatchItemOut]] = [None] * len(body.check_ins)
+    items: list[Optional[CheckInCreate]] = []
+    for i, raw in enumerate(body.check_ins):
+        try:
+            items.append(CheckInCreate.model_validate(raw))
+        except ValidationError as e:
+            items.append(None)
+            results[i] = CheckInBatchItemOut(index=i, ok=False, error=_validation_message(e))
+    patient_ids = {c.patient_id for c in items if c is not None}
+    known = set((await db.scalars(select(Patient.id).where(Patient.id.in_(patient_ids)))).all()) if patient_ids else set()
+
+    values, indexes = [], []
+    for i, item in enumerate(items):
+        if item is None:
+            continue
+        if item.patient_id not in known:
+            results[i] = CheckInBatchItemOut(index=i, ok=False, error="Patient not found")
+            continue
+        try:
+            dt = datetime.fromisoformat(item.date.replace("Z", "+00:00"))
+        except (ValueError, TypeError):
+            results[i] = CheckInBatchItemOut(index=i, ok=False, error="Invalid date")
+            continue
+        values.append(_check_in_values(item, dt))
+        indexes.append(i)
+
+    if values:
+        symptom, risk, st = score_batch([CheckIn(**v) for v in values])
+        for v, sym, rs, s_ in zip(values, symptom.tolist(), risk.tolist(), st.tolist()):
+            v.update(symptom_score=sym, risk_score=rs, status=s_, score_version=SCORE_VERSION)
+        await db.execute(insert(CheckIn), values)
+        mark_patients_changed(db, {v["patient_id"] for v in values})
+        for i, v in zip(indexes, values):
+            results[i] = CheckInBatchItemOut(index=i, ok=True, id=v["id"], risk_score=v["risk_score"], status=v["status"])
+    return CheckInBatchOut(created=len(values), failed=len(items) - len(values), results=results)
+
+
 @router.post("/check-ins/sync-analytics", status_code=status.HTTP_204_NO_CONTENT)
-def sync_analytics(current: AuthUser = Depends(get_current_user)):
+async def sync_analytics(current: AuthUser = Depends(get_current_user)):
     return Response(status_code=204)
 
 
+# ---- Analytics ----
+@router.get("/analytics/dashboard", response_model=DashboardAnalyticsOut)
+async def dashboard_analytics(
+    request: Request, response: Response, db: AsyncReadDbSession, days: int = Query(30, ge=7, le=365), current: AuthUser = Depends(get_current_user)
+):
+    """Admin dashboard KPIs, per-day series and each patient's latest check-in, aggregated in SQL (UTC days)."""
+    today = datetime.now(timezone.utc).date()
+    # The windows move at midnight UTC even without new data
+    etag = await _etag(request, db, GLOBAL_SCOPE, today.isoformat())
+    if (not_modified := _not_modified(request, etag)) is not None:
+        return not_modified
+    response.headers.update(_etag_headers(etag))
+
+    def _start(d: date) -> datetime:
+        return datetime.combine(d, time.min, tzinfo=timezone.utc)
+
+    # The window is the `days` calendar days ending today, the same days as per_day
+    start_window, start_7d, start_today = _start(today - timedelta(days=days - 1)), _start(today - timedelta(days=7)), _start(today)
+    end = _start(today + timedelta(days=1))
+    symptom = stored_or_computed(CheckIn.symptom_score, symptom_score_expr())
+    risk = stored_or_computed(CheckIn.risk_score, risk_score_expr())
+    in_7d = CheckIn.date >= start_7d
+
+    kpi = (
+        await db.execute(
+            select(
+                func.count(CheckIn.id).filter(CheckIn.date >= start_today),
+                func.count(CheckIn.id).filter(in_7d),
+                func.count(CheckIn.id).filter(CheckIn.date >= start_window),
+                func.count(CheckIn.id).filter(in_7d, risk >= 4),
+                func.avg(symptom).filter(in_7d),
+            ).where(CheckIn.date >= min(start_window, start_7d), CheckIn.date < end)
+        )
+    ).one()
+    count_today, count_7d, count_window, flagged_7d, avg_symptom_7d = kpi
+    patient_count = await db.scalar(select(func.count(Patient.id))) or 0
+
+    day = func.date(func.timezone("UTC", CheckIn.date))
+    per_day_rows = (
+        await db.execute(
+            select(day, func.count(CheckIn.id), func.avg(risk))
+            .where(CheckIn.date >= start_window, CheckIn.date < end)
+            .group_by(day)
+        )
+    ).all()
+    by_day = {d: (n, avg) for d, n, avg in per_day_rows}
+    per_day = []
+    for i in range(days - 1, -1, -1):
+        d = today - timedelta(days=i)
+        n, avg = by_day.get(d, (0, None))
+        per_day.append(DashboardDayOut(date=d.isoformat(), count=n, avg_risk_score=round(avg or 0, 1)))
+
+    latest_sub = (
+        select(
+            CheckIn.patient_id, CheckIn.id.label("check_in_id"), CheckIn.date,
+            symptom.label("symptom_score"), risk.label("risk_score"),
+        )
+        .distinct(CheckIn.patient_id)
+        .order_by(CheckIn.patient_id, CheckIn.date.desc(), CheckIn.id.desc())
+        .subquery()
+    )
+    # status is monotonic in risk, so ordering by risk puts Escalated, then Needs Follow-up, first
+    latest_status = status_expr(func.coalesce(latest_sub.c.risk_score, 0))
+    latest_rows = (
+        await db.execute(
+            select(
+                Patient.id, Patient.name, Patient.condition,
+                latest_sub.c.check_in_id, latest_sub.c.date, latest_sub.c.symptom_score, latest_sub.c.risk_score, latest_status,
+            )
+            .outerjoin(latest_sub, latest_sub.c.patient_id == Patient.id)
+            .order_by(latest_sub.c.risk_score.desc().nulls_last(), Patient.created_at.desc())
+        )
+    ).all()
+    return DashboardAnalyticsOut(
+        days=days,
+        today=today.isoformat(),
+        patient_count=patient_count,
+        check_ins_today=count_today,
+        check_ins_7d=count_7d,
+        check_ins_window=count_window,
+        missing_rate_7d=round((1 - count_7d / (patient_count * 7)) * 100, 1) if patient_count else 0.0,
+        flagged_7d=flagged_7d,
+        avg_symptom_score_7d=round(avg_symptom_7d, 1) if avg_symptom_7d is not None else None,
+        per_day=per_day,
+        latest=[
+            DashboardLatestOut(
+                patient_id=pid, patient_name=name, condition=condition or "", check_in_id=cid,
+                date=(dt.isoformat() if dt else None), symptom_score=sym, risk_score=rs, status=st,
+            )
+            for pid, name, condition, cid, dt, sym, rs, st in latest_rows
+        ],
+    )
+
+
 # ---- Chat / RAG ----
-def _get_or_create_conversation(user_id: str, db: DbSession) -> Conversation:
+async def _get_or_create_conversation(user_id: str, db: AsyncSession) -> Conversation:
     """One conversation per user (single thread)."""
-    conv = db.query(Conversation).filter(Conversation.user_id == user_id).order_by(Conversation.updated_at.desc()).first()
+    conv = await db.scalar(
+        select(Conversation).where(Conversation.user_id == user_id).order_by(Conversation.updated_at.desc()).limit(1)
+    )
     if conv:
         return conv
     conv = Conversation(id=str(uuid.uuid4()), user_id=user_id)
     db.add(conv)
-    db.flush()
+    await db.flush()
     return conv
 
 
-@router.post("/chat", response_model=ChatResponse)
-def chat(body: ChatRequest, db: DbSession, current: AuthUser = Depends(get_current_user)):
-    """RAG chat endpoint. Chats stored in SQL; embeddings in pgvector for semantic search."""
-    try:
-        conv = _get_or_create_conversation(current.id, db)
-        user_msg_id = str(uuid.uuid4())
-        user_embedding = get_embedding(body.message)
-        db.add(
-            ChatMessageModel(
-                id=user_msg_id,
-                conversation_id=conv.id,
-                role="user",
-                content=body.message,
-                embedding=user_embedding,
+async def _start_chat_turn(body: ChatRequest, user_id: str, rag: RAGChat, retrieve: bool = True) -> tuple[str, str]:
+    """Store the user's message and retrieve RAG context in one short session. Returns (conversation_id, context);
+    context is empty when retrieve is False (answer already known)."""
+    user_msg_id = str(uuid.uuid4())
+    with stage("db_session"):
+        async with get_async_session_factory()() as db:
+            conv = await _get_or_create_conversation(user_id, db)
+            conv_id = conv.id
+            db.add(
+                ChatMessageModel(
+                    id=user_msg_id,
+                    conversation_id=conv_id,
+                    user_id=user_id,
+                    role="user",
+                    content=body.message,
+                    embedding=None,
+                )
             )
-        )
-        db.flush()
+            context = ""
+            if retrieve and read_replica_enabled():
+                # Vector search on the replica; the patient context stays on the primary (see retrieve_context)
+                async with get_async_read_session_factory()() as read_db:
+                    context = await rag.retrieve_context(body.message, user_id, db, read_db=read_db)
+            elif retrieve:
+                context = await rag.retrieve_context(body.message, user_id, db)
+            await db.commit()
+    # The worker's embedding of this message hits the cache entry left by the retrieval query
+    get_embedding_worker().enqueue([user_msg_id])
+    return conv_id, context
+
+
+async def _save_assistant_message(conv_id: str, user_id: str, text: str) -> str:
+    assistant_msg_id = str(uuid.uuid4())
+    with stage("db_session"):
+        async with get_async_session_factory()() as db:
+            db.add(
+                ChatMessageModel(
+                    id=assistant_msg_id,
+                    conversation_id=conv_id,
+                    user_id=user_id,
+                    role="assistant",
+                    content=text,
+                    embedding=None,
+                )
+            )
+            await db.execute(update(Conversation).where(Conversation.id == conv_id).values(updated_at=datetime.utcnow()))
+            await db.commit()
+    get_embedding_worker().enqueue([assistant_msg_id])
+    return assistant_msg_id
+
 
+def _history(body: ChatRequest) -> Optional[List[dict]]:
+    if not body.conversation_history:
+        return None
+    return [{"role": msg.role, "content": msg.content} for msg in body.conversation_history]
+
+
+@router.post("/chat", response_model=ChatResponse)
+async def chat(body: ChatRequest, current: AuthUser = Depends(get_current_user)):
+    """RAG chat endpoint. Chats stored in SQL; embeddings in pgvector for semantic search.
+    DB sessions are short and closed before generation, so a slow LLM holds no pooled connection."""
+    try:
         rag = get_rag_chat()
-        history = None
-        if body.conversation_history:
-            history = [{"role": msg.role, "content": msg.content} for msg in body.conversation_history]
-        response_text = rag.chat(body.message, current.id, db, history)
-
-        assistant_msg_id = str(uuid.uuid4())
-        assistant_embedding = get_embedding(response_text)
-        db.add(
-            ChatMessageModel(
-                id=assistant_msg_id,
-                conversation_id=conv.id,
-                role="assistant",
-                content=response_text,
-                embedding=assistant_embedding,
-            )
-        )
-        conv.updated_at = datetime.utcnow()
+        lookup = await lookup_answer(current.id, body.message)
+        if lookup.answer is not None:
+            conv_id, _ = await _start_chat_turn(body, current.id, rag, retrieve=False)
+            await _save_assistant_message(conv_id, current.id, lookup.answer)
+            return ChatResponse(response=lookup.answer, provider=rag.provider, cached=True)
+        conv_id, context = await _start_chat_turn(body, current.id, rag)
+        history = _history(body)
+        try:
+            response_text = await rag.generate(body.message, context, history)
+            generated = True
+        except LLMError as e:
+            # Shown and stored as the reply, but never cached as an answer
+            response_text, generated = str(e), False
+        await _save_assistant_message(conv_id, current.id, response_text)
+        if generated:
+            remember_answer(lookup, response_text)
+        return ChatResponse(response=response_text, provider=rag.provider, prompt_tokens=rag.prompt_tokens(body.message, context, history))
+    except LLMBusyError as e:
+        raise HTTPException(status_code=503, detail=f"Chat is busy, try again shortly: {e}", headers={"Retry-After": "5"})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Chat error: {str(e)}")
 
-        return ChatResponse(response=response_text, provider=rag.provider)
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/chat/stream")
+async def chat_stream(body: ChatRequest, current: AuthUser = Depends(get_current_user)):
+    """Like /chat, but streams the answer as Server-Sent Events: `token` events ({"text"}) as the
+    model generates, then `done` ({"message_id", "provider", "cached", "prompt_tokens"}) once the reply has been stored,
+    or `error` ({"detail"}). The assistant message is persisted only after the stream ends."""
+    rag = get_rag_chat()
+    lookup = await lookup_answer(current.id, body.message)
+
+    async def events():
+        if lookup.answer is not None:
+            # Answer cache hit: no model slot or retrieval needed
+            conv_id, _ = await _start_chat_turn(body, current.id, rag, retrieve=False)
+            yield ""
+            yield _sse("token", {"text": lookup.answer})
+            message_id = await _save_assistant_message(conv_id, current.id, lookup.answer)
+            yield _sse("done", {"message_id": message_id, "provider": rag.provider, "cached": True})
+            return
+        # When the model queue is already full, fail fast (503) before storing anything
+        rag.limiter.check()
+        conv_id, context = await _start_chat_turn(body, current.id, rag)
+        yield ""  # ready: the response (and its status code) starts only after this point
+        parts = []
+        history = _history(body)
+        generated = True
+        try:
+            # The slot covers generation only, so turn setup and saving never hold a model slot
+            async with rag.limiter.slot():
+                try:
+                    async for chunk in rag.generate_stream(body.message, context, history):
+                        parts.append(chunk)
+                        yield _sse("token", {"text": chunk})
+                except LLMError as e:
+                    # Shown and stored as the end of the reply, but never cached as an answer
+                    generated = False
+                    parts.append(str(e))
+                    yield _sse("token", {"text": str(e)})
+            message_id = await _save_assistant_message(conv_id, current.id, "".join(parts) or "No response.")
+        except Exception as e:
+            yield _sse("error", {"detail": f"Chat error: {str(e)}"})
+            return
+        if generated:
+            remember_answer(lookup, "".join(parts))
+        yield _sse("done", {
+            "message_id": message_id,
+            "provider": rag.provider,
+            "cached": False,
+            "prompt_tokens": rag.prompt_tokens(body.message, context, history),
+        })
+
+    stream = events()
+    try:
+        await anext(stream)
+    except LLMBusyError as e:
+        raise HTTPException(status_code=503, detail=f"Chat is busy, try again shortly: {e}", headers={"Retry-After": "5"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Chat error: {str(e)}")
 
+    return StreamingResponse(
+        stream,
+        media_type="text/event-stream",
+        # no-transform / X-Accel-Buffering: keep proxies (nginx, gzip) from buffering tokens
+        headers={"Cache-Control": "no-cache, no-transform", "X-Accel-Buffering": "no"},
+    )
+
 
 @router.get("/chat/history", response_model=ConversationHistoryOut)
-def chat_history(db: DbSession, current: AuthUser = Depends(get_current_user)):
+async def chat_history(db: AsyncReadDbSession, current: AuthUser = Depends(get_current_user)):
     """Return the current user's chat messages (SQL-stored conversation)."""
-    conv = db.query(Conversation).filter(Conversation.user_id == current.id).order_by(Conversation.updated_at.desc()).first()
+    conv = await db.scalar(
+        select(Conversation).where(Conversation.user_id == current.id).order_by(Conversation.updated_at.desc()).limit(1)
+    )
     if not conv:
         return ConversationHistoryOut(conversation_id="", messages=[])
-    rows = db.query(ChatMessageModel).filter(ChatMessageModel.conversation_id == conv.id).order_by(ChatMessageModel.created_at.asc()).all()
+    # Explicit columns: skip loading and parsing each message's embedding
+    rows = (
+        await db.execute(
+            select(ChatMessageModel.id, ChatMessageModel.role, ChatMessageModel.content, ChatMessageModel.created_at)
+            .where(ChatMessageModel.conversation_id == conv.id)
+            .order_by(ChatMessageModel.created_at.asc())
+        )
+    ).all()
     return ConversationHistoryOut(
         conversation_id=conv.id,
         messages=[
@@ -188,9 +716,13 @@ def chat_history(db: DbSession, current: AuthUser = Depends(get_current_user)):
 
 # ---- Seed ----
 @router.post("/seed")
-def seed(db: DbSession):
-    if db.query(Patient).first():
+async def seed(db: AsyncDbSession):
+    if await db.scalar(select(Patient.id).limit(1)):
         return {"message": "Already seeded"}
-    db.add(Patient(id=str(uuid.uuid4()), name="Demo Patient", age=65, condition="CHF"))
-    db.add(Patient(id=str(uuid.uuid4()), name="Jane Doe", age=58, condition="COPD"))
+    patients = [
+        Patient(id=str(uuid.uuid4()), name="Demo Patient", age=65, condition="CHF"),
+        Patient(id=str(uuid.uuid4()), name="Jane Doe", age=58, condition="COPD"),
+    ]
+    db.add_all(patients)
+    mark_patients_changed(db, [p.id for p in patients])
     return {"message": "Seeded demo patients"}
@@ -43,10 +43,25 @@ CREATE TABLE IF NOT EXISTS check_ins (
     appetite VARCHAR(20) DEFAULT 'Normal',
     mobility VARCHAR(20) DEFAULT 'Normal',
     devices TEXT,
-    notes TEXT
+    notes TEXT,
+    -- Scores computed at write time; score_version marks which scoring rules produced them
+    symptom_score FLOAT,
+    risk_score FLOAT,
+    status VARCHAR(20),
+    score_version INTEGER
 );
 
+-- Existing databases: add the score columns (backfill with: python maintenance.py backfill-scores)
+ALTER TABLE check_ins ADD COLUMN IF NOT EXISTS symptom_score FLOAT;
+ALTER TABLE check_ins ADD COLUMN IF NOT EXISTS risk_score FLOAT;
+ALTER TABLE check_ins ADD COLUMN IF NOT EXISTS status VARCHAR(20);
+ALTER TABLE check_ins ADD COLUMN IF NOT EXISTS score_version INTEGER;
+
 CREATE INDEX IF NOT EXISTS ix_check_ins_patient_id ON check_ins(patient_id);
+-- Keyset pagination of a patient's history (ORDER BY date DESC, id DESC without a sort)
+CREATE INDEX IF NOT EXISTS ix_check_ins_patient_id_date_id ON check_ins(patient_id, date DESC, id DESC);
+-- Filter by stored status in the database (e.g. Escalated check-ins this week)
+CREATE INDEX IF NOT EXISTS ix_check_ins_status_date ON check_ins(status, date);
 CREATE INDEX IF NOT EXISTS ix_users_email ON users(email);
 
 -- Chats: store in SQL and vector DB (embeddings in same DB via pgvector).
@@ -60,6 +75,7 @@ CREATE TABLE IF NOT EXISTS conversations (
 CREATE TABLE IF NOT EXISTS chat_messages (
     id VARCHAR(36) PRIMARY KEY,
     conversation_id VARCHAR(36) NOT NULL REFERENCES conversations(id) ON DELETE CASCADE,
+    user_id VARCHAR(36) REFERENCES users(id),
     role VARCHAR(20) NOT NULL,
     content TEXT NOT NULL,
     created_at TIMESTAMPTZ DEFAULT NOW(),
@@ -68,5 +84,16 @@ CREATE TABLE IF NOT EXISTS chat_messages (
 
 CREATE INDEX IF NOT EXISTS ix_conversations_user_id ON conversations(user_id);
 CREATE INDEX IF NOT EXISTS ix_chat_messages_conversation_id ON chat_messages(conversation_id);
--- Optional: add IVFFlat index for faster vector search after you have many rows:
--- CREATE INDEX ix_chat_messages_embedding ON chat_messages USING ivfflat (embedding vector_cosine_ops) WITH (lists = 100);
+-- Existing databases: denormalize the owner onto each message for per-user vector search
+ALTER TABLE chat_messages ADD COLUMN IF NOT EXISTS user_id VARCHAR(36) REFERENCES users(id);
+CREATE INDEX IF NOT EXISTS ix_chat_messages_user_id ON chat_messages(user_id);
+UPDATE chat_messages m SET user_id = c.user_id FROM conversations c WHERE c.id = m.conversation_id AND m.user_id IS NULL;
+-- ANN index for vector search (the app creates/tunes it from CHAT_ANN_* settings; see vector_index.py
+-- and `python maintenance.py vector-index`). Default equivalent:
+CREATE INDEX IF NOT EXISTS ix_chat_messages_embedding ON chat_messages USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64);
+
+-- Change counters per patient and for all patients ("*"), bumped in the writing transaction (ETags, cache keys)
+CREATE TABLE IF NOT EXISTS data_versions (
+    scope VARCHAR(36) PRIMARY KEY,
+    version BIGINT NOT NULL
+);
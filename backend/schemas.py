@@ -1,7 +1,9 @@
 """Request/response models for the API."""
 from typing import Any, List, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+
+from config import settings
 
 
 class UserCreate(BaseModel):
@@ -74,6 +76,26 @@ class CheckInCreate(BaseModel):
     notes: Optional[str] = None
 
 
+class CheckInBatchCreate(BaseModel):
+    # Items are validated one by one in the route, so a bad item is reported in its result, not as a 422
+    check_ins: List[Any] = Field(max_length=settings.check_in_batch_max)
+
+
+class CheckInBatchItemOut(BaseModel):
+    index: int  # position in the request's check_ins list
+    ok: bool
+    id: Optional[str] = None
+    risk_score: Optional[float] = None
+    status: Optional[str] = None
+    error: Optional[str] = None
+
+
+class CheckInBatchOut(BaseModel):
+    created: int
+    failed: int
+    results: List[CheckInBatchItemOut]
+
+
 class CheckInWithScoresOut(BaseModel):
     id: str
     patient_id: str
@@ -116,6 +138,8 @@ class ChatRequest(BaseModel):
 class ChatResponse(BaseModel):
     response: str
     provider: str  # "ollama" or "vertex"
+    cached: bool = False  # answer reused from the semantic answer cache
+    prompt_tokens: Optional[int] = None  # estimated prompt size sent to the model (None when cached)
 
 
 class ChatMessageOut(BaseModel):
@@ -128,3 +152,34 @@ class ChatMessageOut(BaseModel):
 class ConversationHistoryOut(BaseModel):
     conversation_id: str
     messages: List[ChatMessageOut]
+
+
+class DashboardDayOut(BaseModel):
+    date: str
+    count: int
+    avg_risk_score: float
+
+
+class DashboardLatestOut(BaseModel):
+    patient_id: str
+    patient_name: str
+    condition: str
+    check_in_id: Optional[str] = None
+    date: Optional[str] = None
+    symptom_score: Optional[float] = None
+    risk_score: Optional[float] = None
+    status: str = "Normal"
+
+
+class DashboardAnalyticsOut(BaseModel):
+    days: int
+    today: str
+    patient_count: int
+    check_ins_today: int
+    check_ins_7d: int
+    check_ins_window: int
+    missing_rate_7d: float  # percent
+    flagged_7d: int
+    avg_symptom_score_7d: Optional[float] = None
+    per_day: List[DashboardDayOut]
+    latest: List[DashboardLatestOut]
@@ -1,8 +1,18 @@
 """Compute symptom/risk scores and status for check-ins (same logic as frontend)."""
 import json
+import operator
+from collections.abc import Sequence
+
+import numpy as np
+from sqlalchemy import case, func, or_, update
+from sqlalchemy.orm import Session
 
 from database import CheckIn
 
+# Bump when the scoring rules below change; rows with another version are recomputed
+# on read and by `python maintenance.py backfill-scores`.
+SCORE_VERSION = 1
+
 SYMPTOM_KEYS = (
     "fatigue", "breathlessness", "cough", "pain", "nausea", "dizziness",
     "swelling", "anxiety", "headache", "chest_tightness", "joint_stiffness",
@@ -32,39 +42,215 @@ def _status(risk: float) -> str:
     return "Escalated"
 
 
-def check_in_to_response(row: CheckIn) -> dict:
-    devices = None
+def symptom_score_expr():
+    """SQL expression equivalent of _symptom_score, for aggregating in the database."""
+    total = sum(func.coalesce(getattr(CheckIn, k), 0.0) for k in SYMPTOM_KEYS)
+    return func.round(total / float(len(SYMPTOM_KEYS)) * 10.0) / 10.0
+
+
+def risk_score_expr():
+    """SQL expression equivalent of _risk_score."""
+    sleep = func.coalesce(CheckIn.sleep_hours, 0.0)
+    s = (
+        symptom_score_expr()
+        + case((CheckIn.meds_taken.is_(True), 0.0), else_=1.5)
+        + case((sleep < 5, 1.0), (sleep < 7, 0.5), else_=0.0)
+    )
+    return func.least(10.0, func.round(s * 10.0) / 10.0)
+
+
+def status_expr(risk):
+    """SQL expression equivalent of _status for a risk score expression/column."""
+    return case((risk < 4, "Normal"), (risk <= 7, "Needs Follow-up"), else_="Escalated")
+
+
+def stored_or_computed(column, expr):
+    """Use the persisted score column when it is current, else compute it in SQL."""
+    return case((CheckIn.score_version == SCORE_VERSION, column), else_=expr)
+
+
+def _has_current_scores(row: CheckIn) -> bool:
+    return getattr(row, "score_version", None) == SCORE_VERSION
+
+
+def apply_scores(row: CheckIn) -> CheckIn:
+    """Fill the persisted score columns on a new/changed row."""
+    risk = _risk_score(row)
+    row.symptom_score = _symptom_score(row)
+    row.risk_score = risk
+    row.status = _status(risk)
+    row.score_version = SCORE_VERSION
+    return row
+
+
+def backfill_scores(db: Session, batch_size: int = 1000) -> int:
+    """Compute and store scores for rows that have none or an outdated score_version. Returns rows updated."""
+    updated = 0
+    last_id = ""
+    stale = or_(CheckIn.score_version.is_(None), CheckIn.score_version != SCORE_VERSION)
+    while True:
+        rows = (
+            db.query(CheckIn)
+            .filter(stale, CheckIn.id > last_id)
+            .order_by(CheckIn.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            return updated
+        symptom, risk, status = score_batch(rows)
+        db.execute(
+            update(CheckIn),
+            [
+                {"id": r.id, "symptom_score": sym, "risk_score": rs, "status": st, "score_version": SCORE_VERSION}
+                for r, sym, rs, st in zip(rows, symptom.tolist(), risk.tolist(), status.tolist())
+            ],
+        )
+        db.commit()
+        updated += len(rows)
+        last_id = rows[-1].id
+
+
+# score_batch inputs, in the column order of its matrix
+_SCORE_INPUTS = (*SYMPTOM_KEYS, "meds_taken", "sleep_hours")
+_inputs_from_state = operator.itemgetter(*_SCORE_INPUTS)
+_inputs_from_attrs = operator.attrgetter(*_SCORE_INPUTS)
+
+
+def _score_inputs(row: CheckIn) -> tuple:
+    try:
+        # Loaded column values straight from the instance state: one C call instead of an ORM
+        # descriptor lookup per attribute (the bulk of the per-row scorer's cost)
+        return _inputs_from_state(row.__dict__)
+    except KeyError:
+        return _inputs_from_attrs(row)  # expired/unloaded or unset (transient) attributes
+
+
+def score_batch(rows: Sequence[CheckIn]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Vectorized _symptom_score / _risk_score / _status for many rows at once.
+    Returns (symptom_scores, risk_scores, statuses) arrays aligned with rows; results
+    are identical to the per-row functions (same summation order and rounding).
+    """
+    values = [_score_inputs(r) for r in rows]
+    m = np.array(values, dtype=np.float64).reshape(len(rows), len(_SCORE_INPUTS))  # None -> nan
+    if np.isnan(m).any():
+        # Missing values count as 0 like `or 0` in the per-row scorer; a stored NaN stays NaN there too
+        obj = np.array(values, dtype=object).reshape(m.shape)
+        m = np.where(obj == None, 0.0, m)  # noqa: E711 (elementwise)
+    n_sym = len(SYMPTOM_KEYS)
+    return score_arrays(m[:, :n_sym], m[:, n_sym] != 0, m[:, n_sym + 1])
+
+
+def score_arrays(symptoms: np.ndarray, meds: np.ndarray, sleep: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    score_batch over plain arrays (e.g. generated data): symptoms (n, len(SYMPTOM_KEYS)) in
+    SYMPTOM_KEYS order, meds taken (bool, n) and sleep hours (n); no missing values.
+    """
+    n = symptoms.shape[0]
+    # Add columns left to right like sum() does; np.sum's pairwise order can differ in the last bit
+    total = np.zeros(n)
+    for j in range(len(SYMPTOM_KEYS)):
+        total += symptoms[:, j]
+    symptom = np.round((total / len(SYMPTOM_KEYS)) * 10) / 10
+
+    risk = symptom + np.where(meds, 0.0, 1.5)
+    risk = risk + np.where(sleep < 5, 1.0, np.where(sleep < 7, 0.5, 0.0))
+    risk = np.minimum(10.0, np.round(risk * 10) / 10)
+
+    status = np.where(risk < 4, "Normal", np.where(risk <= 7, "Needs Follow-up", "Escalated"))
+    return symptom, risk, status
+
+
+def _devices(row: CheckIn):
     if row.devices:
         try:
-            devices = json.loads(row.devices)
+            return json.loads(row.devices)
         except (TypeError, ValueError):
             pass
-    risk = _risk_score(row)
+    return None
+
+
+def _base_response(row: CheckIn) -> dict:
+    # Same types as CheckInWithScoresOut (floats stay floats) so responses can skip re-validation
     return {
         "id": row.id,
         "patient_id": row.patient_id,
         "date": row.date.isoformat() if hasattr(row.date, "isoformat") else str(row.date),
-        "fatigue": row.fatigue or 0,
-        "breathlessness": row.breathlessness or 0,
-        "cough": row.cough or 0,
-        "pain": row.pain or 0,
-        "nausea": row.nausea or 0,
-        "dizziness": row.dizziness or 0,
-        "swelling": row.swelling or 0,
-        "anxiety": row.anxiety or 0,
-        "headache": row.headache or 0,
-        "chest_tightness": row.chest_tightness or 0,
-        "joint_stiffness": row.joint_stiffness or 0,
-        "skin_issues": row.skin_issues or 0,
-        "constipation": row.constipation or 0,
-        "bloating": row.bloating or 0,
-        "sleep_hours": row.sleep_hours or 0,
+        **{k: getattr(row, k) or 0.0 for k in SYMPTOM_KEYS},
+        "sleep_hours": row.sleep_hours or 0.0,
         "meds_taken": row.meds_taken if row.meds_taken is not None else True,
         "appetite": row.appetite or "Normal",
         "mobility": row.mobility or "Normal",
-        "devices": devices,
+        "devices": _devices(row),
         "notes": row.notes,
+    }
+
+
+def check_in_to_response(row: CheckIn) -> dict:
+    if _has_current_scores(row):
+        return {**_base_response(row), "symptom_score": row.symptom_score, "risk_score": row.risk_score, "status": row.status}
+    risk = _risk_score(row)
+    return {
+        **_base_response(row),
         "symptom_score": _symptom_score(row),
         "risk_score": risk,
         "status": _status(risk),
     }
+
+
+def _scores(rows: Sequence[CheckIn]) -> list[tuple]:
+    """(symptom_score, risk_score, status) per row: stored when current, the rest in one vectorized pass."""
+    stale = [r for r in rows if not _has_current_scores(r)]
+    computed = {}
+    if stale:
+        symptom, risk, status = score_batch(stale)
+        computed = {id(r): s for r, s in zip(stale, zip(symptom.tolist(), risk.tolist(), status.tolist()))}
+    return [computed.get(id(row)) or (row.symptom_score, row.risk_score, row.status) for row in rows]
+
+
+def check_ins_to_response(rows: Sequence[CheckIn]) -> list[dict]:
+    """Batch version of check_in_to_response."""
+    return [
+        {**_base_response(row), "symptom_score": sym, "risk_score": rs, "status": st}
+        for row, (sym, rs, st) in zip(rows, _scores(rows))
+    ]
+
+
+SCORE_FIELDS = ("symptom_score", "risk_score", "status")
+# Per-field versions of _base_response, for columnar responses
+_FIELD_GETTERS = {
+    "id": lambda r: r.id,
+    "patient_id": lambda r: r.patient_id,
+    "date": lambda r: r.date.isoformat() if hasattr(r.date, "isoformat") else str(r.date),
+    **{k: (lambda r, k=k: getattr(r, k) or 0.0) for k in SYMPTOM_KEYS},
+    "sleep_hours": lambda r: r.sleep_hours or 0.0,
+    "meds_taken": lambda r: r.meds_taken if r.meds_taken is not None else True,
+    "appetite": lambda r: r.appetite or "Normal",
+    "mobility": lambda r: r.mobility or "Normal",
+    "devices": _devices,
+    "notes": lambda r: r.notes,
+}
+RESPONSE_FIELDS = (*_FIELD_GETTERS, *SCORE_FIELDS)
+
+
+def columns_for_fields(fields: Sequence[str]) -> list[str]:
+    """CheckIn attributes needed to build these response fields (for load_only); scores may need their inputs."""
+    names = {"id", "date", *(f for f in fields if f not in SCORE_FIELDS)}
+    if any(f in SCORE_FIELDS for f in fields):
+        names.update(("score_version", *SCORE_FIELDS, *SYMPTOM_KEYS, "meds_taken", "sleep_hours"))
+    return sorted(names)
+
+
+def check_ins_to_columns(rows: Sequence[CheckIn], fields: Sequence[str]) -> dict[str, list]:
+    """check_ins_to_response transposed to {field: [value per row]}, computing only the given fields."""
+    scores = _scores(rows) if any(f in SCORE_FIELDS for f in fields) else []
+    columns = {}
+    for field in fields:
+        if field in SCORE_FIELDS:
+            i = SCORE_FIELDS.index(field)
+            columns[field] = [s[i] for s in scores]
+        else:
+            get = _FIELD_GETTERS[field]
+            columns[field] = [get(r) for r in rows]
+    return columns
@@ -0,0 +1,131 @@
+"""
+Opt-in SQL profiler (SQL_PROFILE=true) on SQLAlchemy engine events.
+
+Per request: number of queries and total database time (a log line, the `sql` entry of
+Server-Timing and the app_sql_queries_per_request / app_sql_seconds_per_request histograms per
+route; single statements go to app_stage_duration_seconds{stage="sql"}). Statements slower than SQL_SLOW_QUERY_MS are logged with parameter values redacted.
+The same statement run SQL_REPEAT_THRESHOLD or more times in one request (the N+1 pattern) is
+logged and counted in app_sql_repeated_statements_total.
+"""
+import logging
+import time
+from collections import Counter as _Tally
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+
+from config import settings
+from metrics import Counter, Histogram, record_stage, register
+
+logger = logging.getLogger(__name__)
+
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+# Longest statement text written to a log line
+LOG_SQL_CHARS = 500
+
+queries_total = register(Counter("app_sql_queries_total", "SQL statements executed"))
+slow_queries_total = register(Counter("app_sql_slow_queries_total", "SQL statements slower than SQL_SLOW_QUERY_MS"))
+queries_per_request = register(Histogram("app_sql_queries_per_request", "SQL statements per HTTP request", ("route",), buckets=QUERY_BUCKETS))
+seconds_per_request = register(Histogram("app_sql_seconds_per_request", "Database time per HTTP request", ("route",)))
+repeated_total = register(
+    Counter("app_sql_repeated_statements_total", "Requests that ran one statement SQL_REPEAT_THRESHOLD+ times (N+1)", ("route",))
+)
+
+
+class RequestQueries:
+    """Queries seen during one request."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements: _Tally = _Tally()
+
+
+_current: ContextVar[Optional[RequestQueries]] = ContextVar("sql_profile", default=None)
+
+
+def _one_line(statement: str) -> str:
+    text = " ".join(statement.split())
+    return text if len(text) <= LOG_SQL_CHARS else text[:LOG_SQL_CHARS] + "..."
+
+
+def redact(parameters) -> object:
+    """Parameter structure with every value replaced by its type name (no patient data in logs)."""
+    if isinstance(parameters, dict):
+        return {k: f"<{type(v).__name__}>" for k, v in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            return f"[{len(parameters)} parameter sets of {redact(parameters[0])}]"
+        return [f"<{type(v).__name__}>" for v in parameters]
+    return "<redacted>" if parameters is not None else None
+
+
+def _before(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("sql_profile_start", []).append(time.perf_counter())
+
+
+def _after(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("sql_profile_start")
+    if not starts:
+        return
+    seconds = time.perf_counter() - starts.pop()
+    queries_total.inc()
+    # Per-statement histogram (app_stage_duration_seconds{stage="sql"}) and the request's Server-Timing
+    record_stage("sql", seconds)
+    current = _current.get()
+    if current is not None:
+        current.count += 1
+        current.seconds += seconds
+        current.statements[statement] += 1
+    if seconds * 1000 >= settings.sql_slow_query_ms:
+        slow_queries_total.inc()
+        logger.warning("Slow query (%.1f ms): %s params=%s", seconds * 1000, _one_line(statement), redact(parameters))
+
+
+def _error(context):
+    # The statement failed: drop its start time so the stack stays aligned
+    conn = context.connection
+    if conn is not None and conn.info.get("sql_profile_start"):
+        conn.info["sql_profile_start"].pop()
+
+
+def instrument_engine(engine) -> None:
+    """Attach the profiler to a sync Engine (for an AsyncEngine pass engine.sync_engine)."""
+    if event.contains(engine, "before_cursor_execute", _before):
+        return
+    event.listen(engine, "before_cursor_execute", _before)
+    event.listen(engine, "after_cursor_execute", _after)
+    event.listen(engine, "handle_error", _error)
+
+
+class SQLProfilerMiddleware:
+    """Collects the queries of each HTTP request and reports them when it ends (pure ASGI)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        queries = RequestQueries()
+        token = _current.set(queries)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current.reset(token)
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            report(f"{scope.get('method', '')} {route}", route, queries)
+
+
+def report(label: str, route: str, queries: RequestQueries) -> None:
+    queries_per_request.observe(queries.count, route)
+    seconds_per_request.observe(queries.seconds, route)
+    if not queries.count:
+        return
+    logger.info("%s: %d queries, %.1f ms in the database", label, queries.count, queries.seconds * 1000)
+    repeated = [(n, sql) for sql, n in queries.statements.most_common() if n >= settings.sql_repeat_threshold]
+    if repeated:
+        repeated_total.inc(route)
+        for n, sql in repeated:
+            logger.warning("Possible N+1 in %s: %dx %s", label, n, _one_line(sql))
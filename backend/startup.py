@@ -0,0 +1,180 @@
+"""
+Boot-time schema setup and background warm-up.
+
+Schema: the DDL (pgvector extension, create_all, MIGRATIONS, ANN index) is fingerprinted and the
+fingerprint stored in schema_meta. With STARTUP_DDL=auto a boot whose fingerprint is already
+stored runs a single SELECT instead of the DDL; "always" runs it anyway, "never" skips it (schema
+managed by deploy jobs, e.g. `python maintenance.py migrate`). When the ANN index was not built
+(too many rows, or an error) the recorded fingerprint leaves out the ANN part, so later boots
+retry until `python maintenance.py vector-index` has built it.
+
+Warm-up: after the port is open, connects the DB pools, creates the RAG client (imports the
+Vertex SDK), loads the embedding model and starts the password workers, so the first requests
+after a scale-from-zero do not pay for them. GET /ready reports progress.
+"""
+import hashlib
+import logging
+import time
+from typing import Dict, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from config import settings
+from database import MIGRATIONS, Base, apply_migrations, get_async_engine
+from vector_index import ensure_vector_index
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_META_DDL = (
+    "CREATE TABLE IF NOT EXISTS schema_meta ("
+    "id INTEGER PRIMARY KEY, fingerprint VARCHAR(64) NOT NULL, applied_at TIMESTAMPTZ NOT NULL DEFAULT now())"
+)
+
+
+def schema_fingerprint(ann: bool = True) -> str:
+    """Hash of everything the startup DDL would create; changes whenever models, MIGRATIONS or ANN settings do.
+    With ann=False the ANN index is left out (recorded when its build was skipped)."""
+    dialect = postgresql.dialect()
+    parts = []
+    for table in Base.metadata.sorted_tables:
+        parts.append(str(CreateTable(table).compile(dialect=dialect)))
+        parts.extend(str(CreateIndex(ix).compile(dialect=dialect)) for ix in sorted(table.indexes, key=lambda ix: ix.name or ""))
+    parts.extend(MIGRATIONS)
+    if ann:
+        parts.append(
+            f"ann:{settings.chat_ann_index}:{settings.chat_hnsw_m}:{settings.chat_hnsw_ef_construction}:{settings.chat_ivfflat_lists}"
+        )
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+def stored_fingerprint(engine) -> Optional[str]:
+    with engine.connect() as conn:
+        if conn.execute(text("SELECT to_regclass('schema_meta')")).scalar() is None:
+            return None
+        return conn.execute(text("SELECT fingerprint FROM schema_meta WHERE id = 1")).scalar()
+
+
+def apply_schema(engine) -> None:
+    """Run the full idempotent DDL and record its fingerprint."""
+    with engine.connect() as conn:
+        try:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+            conn.commit()
+        except Exception:
+            # e.g. local postgres image without pgvector: use pgvector/pgvector:pg16 in docker-compose
+            conn.rollback()
+    Base.metadata.create_all(bind=engine)
+    apply_migrations(engine)
+    ann_done = False
+    try:
+        result = ensure_vector_index(engine, max_rows=settings.chat_ann_autocreate_max_rows)
+        ann_done = result != "skipped"
+        logger.info("Chat vector index: %s", result)
+    except Exception:
+        # e.g. pgvector missing or too old for HNSW; search falls back to an exact scan
+        logger.exception("Could not create the chat vector index")
+    if not ann_done:
+        logger.error(
+            "Chat vector index missing: chat search uses an exact scan and boots re-run the schema DDL "
+            "until it exists. Run: python maintenance.py vector-index"
+        )
+    with engine.begin() as conn:
+        conn.execute(text(SCHEMA_META_DDL))
+        conn.execute(
+            text(
+                "INSERT INTO schema_meta (id, fingerprint) VALUES (1, :f) "
+                "ON CONFLICT (id) DO UPDATE SET fingerprint = EXCLUDED.fingerprint, applied_at = now()"
+            ),
+            {"f": schema_fingerprint(ann=ann_done)},
+        )
+
+
+def ensure_schema(engine, mode: Optional[str] = None) -> str:
+    """Apply the DDL according to mode (STARTUP_DDL: auto, always, never). Returns what was done."""
+    mode = (mode or settings.startup_ddl).lower()
+    if mode == "never":
+        return "skipped (STARTUP_DDL=never)"
+    if mode == "auto" and stored_fingerprint(engine) == schema_fingerprint():
+        return "current"
+    apply_schema(engine)
+    return "applied"
+
+
+class WarmupState:
+    """Progress of the background warm-up: per step "pending", "ok", "error: ..." and seconds taken."""
+
+    def __init__(self):
+        self.steps: Dict[str, str] = {}
+        self.seconds: Dict[str, float] = {}
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.finished is not None
+
+    def as_dict(self) -> dict:
+        return {
+            "ready": self.ready,
+            "steps": dict(self.steps),
+            "seconds": {k: round(v, 3) for k, v in self.seconds.items()},
+            "total_seconds": round((self.finished or time.perf_counter()) - self.started, 3) if self.started else None,
+        }
+
+
+warmup_state = WarmupState()
+
+
+async def _warm_database():
+    # Request traffic only uses the async engine; the sync one (DDL, maintenance) keeps no pool
+    async with get_async_engine().connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+
+async def _warm_rag():
+    from rag import get_rag_chat
+
+    await run_in_threadpool(get_rag_chat)
+
+
+async def _warm_embeddings():
+    from embeddings import get_backend, get_embedding
+
+    if await run_in_threadpool(get_backend) is not None:
+        # One tiny embedding: loads the Vertex model handle / the Ollama model into memory
+        await run_in_threadpool(get_embedding, "warm-up", "RETRIEVAL_QUERY")
+
+
+async def _warm_passwords():
+    from passwords import hash_password
+
+    await hash_password("warm-up")
+
+
+async def warm_up() -> None:
+    """Run each warm-up step, logging its duration. A failed step is reported, not raised; it initialises on first use."""
+    state = warmup_state
+    state.started = time.perf_counter()
+    steps = [("rag", _warm_rag), ("embeddings", _warm_embeddings), ("passwords", _warm_passwords)]
+    if (settings.database_url or "").strip():
+        steps.insert(0, ("database", _warm_database))
+    for name, _ in steps:
+        state.steps[name] = "pending"
+    for name, step in steps:
+        t0 = time.perf_counter()
+        try:
+            await step()
+            state.steps[name] = "ok"
+        except Exception as e:
+            state.steps[name] = f"error: {e}"
+            logger.warning("Warm-up step %s failed: %s", name, e)
+        state.seconds[name] = time.perf_counter() - t0
+    state.finished = time.perf_counter()
+    logger.info(
+        "Warm-up finished in %.2fs (%s)",
+        state.finished - state.started,
+        ", ".join(f"{k} {v:.2f}s" for k, v in state.seconds.items()),
+    )
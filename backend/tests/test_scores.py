@@ -0,0 +1,91 @@
+"""score_batch (vectorized) must match the per-row scoring functions exactly."""
+import random
+
+import pytest
+
+from database import CheckIn
+from scores import (
+    SCORE_VERSION,
+    SYMPTOM_KEYS,
+    _risk_score,
+    _status,
+    _symptom_score,
+    apply_scores,
+    check_in_to_response,
+    check_ins_to_response,
+    score_batch,
+)
+
+
+def _row(symptoms=None, meds_taken=True, sleep_hours=8.0, **fields) -> CheckIn:
+    values = symptoms if isinstance(symptoms, dict) else {k: symptoms for k in SYMPTOM_KEYS}
+    return CheckIn(id=fields.pop("id", "c"), patient_id="p", meds_taken=meds_taken, sleep_hours=sleep_hours, **values, **fields)
+
+
+def _random_rows(n: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+
+    def value(choices):
+        return None if rng.random() < 0.1 else rng.choice(choices)
+
+    rows = []
+    for i in range(n):
+        symptoms = {k: value([x / 2 for x in range(21)]) for k in SYMPTOM_KEYS}
+        rows.append(_row(symptoms, meds_taken=value([True, False]), sleep_hours=value([x / 10 for x in range(0, 121)]), id=f"c{i}"))
+    return rows
+
+
+# Rows whose scores land exactly on each threshold, and just either side of it
+THRESHOLD_ROWS = [
+    _row(4.0),                                  # risk 4.0 -> Needs Follow-up (status < 4 is Normal)
+    _row(3.9),                                  # risk 3.9 -> Normal
+    _row(7.0),                                  # risk 7.0 -> Needs Follow-up (<= 7)
+    _row(7.1),                                  # risk 7.1 -> Escalated
+    _row(2.0, sleep_hours=5.0),                 # sleep exactly 5: +0.5, not +1
+    _row(2.0, sleep_hours=4.9),                 # sleep under 5: +1
+    _row(2.0, sleep_hours=7.0),                 # sleep exactly 7: +0
+    _row(2.0, sleep_hours=6.9),                 # sleep under 7: +0.5
+    _row(2.5, meds_taken=False),                # 2.5 + 1.5 = 4.0 exactly
+    _row(5.0, meds_taken=False, sleep_hours=6.0),  # 5.0 + 1.5 + 0.5 = 7.0 exactly
+    _row(10.0, meds_taken=False, sleep_hours=0),   # capped at 10
+    _row(None, meds_taken=None, sleep_hours=None),  # every input missing
+    _row({**{k: 0 for k in SYMPTOM_KEYS}, "fatigue": 0.35}),  # symptom total/14*10 rounding
+    CheckIn(id="bare", patient_id="p"),         # attributes never set (read through the ORM, not the instance dict)
+]
+
+
+def _per_row(rows):
+    return [(_symptom_score(r), _risk_score(r), _status(_risk_score(r))) for r in rows]
+
+
+def _batch(rows):
+    symptom, risk, status = score_batch(rows)
+    return list(zip(symptom.tolist(), risk.tolist(), status.tolist()))
+
+
+@pytest.mark.parametrize("row", THRESHOLD_ROWS)
+def test_score_batch_matches_per_row_on_thresholds(row):
+    assert _batch([row]) == _per_row([row])
+
+
+def test_threshold_statuses():
+    assert [s for _, _, s in _batch(THRESHOLD_ROWS[:4])] == ["Needs Follow-up", "Normal", "Needs Follow-up", "Escalated"]
+    assert [r for _, r, _ in _batch(THRESHOLD_ROWS[8:11])] == [4.0, 7.0, 10.0]
+
+
+def test_score_batch_matches_per_row_on_random_rows():
+    rows = _random_rows(5000) + THRESHOLD_ROWS
+    assert _batch(rows) == _per_row(rows)
+
+
+def test_check_ins_to_response_matches_per_row_with_stored_and_stale_rows():
+    rows = _random_rows(500, seed=11)
+    for r in rows[::2]:
+        apply_scores(r)
+    for r in rows[1::2]:
+        r.score_version = SCORE_VERSION - 1
+    assert check_ins_to_response(rows) == [check_in_to_response(r) for r in rows]
+
+
+def test_score_batch_empty():
+    assert _batch([]) == []
@@ -0,0 +1,130 @@
+"""
+ANN index on chat_messages.embedding (pgvector HNSW or IVFFlat) and per-query search settings.
+
+The index kind and build parameters come from Settings (CHAT_ANN_INDEX, CHAT_HNSW_*, CHAT_IVFFLAT_*).
+Startup creates a missing index on small tables; larger tables are left to
+`python maintenance.py vector-index`, which can also rebuild it CONCURRENTLY after a settings change.
+"""
+import logging
+import math
+import re
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+TABLE = "chat_messages"
+INDEX_NAME = "ix_chat_messages_embedding"
+
+# pgvector version on the server ("0.8.0"); looked up once per process by apply_search_settings
+_pgvector_version: Optional[tuple] = None
+
+
+def _parse_version(value: Optional[str]) -> tuple:
+    return tuple(int(p) for p in re.findall(r"\d+", value or "")[:3])
+
+
+def ivfflat_lists(rows: int) -> int:
+    """pgvector's guideline: rows / 1000 up to 1M rows, sqrt(rows) above."""
+    if settings.chat_ivfflat_lists > 0:
+        return settings.chat_ivfflat_lists
+    if rows <= 1_000_000:
+        return max(10, rows // 1000)
+    return int(math.sqrt(rows))
+
+
+def index_sql(kind: str, rows: int, table: str = TABLE, name: str = INDEX_NAME, concurrently: bool = False) -> str:
+    """CREATE INDEX statement for the configured kind ("hnsw" or "ivfflat") over table.embedding."""
+    how = "CONCURRENTLY " if concurrently else ""
+    if kind == "hnsw":
+        params = f"m = {settings.chat_hnsw_m}, ef_construction = {settings.chat_hnsw_ef_construction}"
+    elif kind == "ivfflat":
+        params = f"lists = {ivfflat_lists(rows)}"
+    else:
+        raise ValueError(f"Unknown ANN index kind: {kind}")
+    return f"CREATE INDEX {how}IF NOT EXISTS {name} ON {table} USING {kind} (embedding vector_cosine_ops) WITH ({params})"
+
+
+def _matches(indexdef: str, kind: str) -> bool:
+    """True when an existing index definition was built with the configured kind and parameters."""
+    if f"USING {kind} " not in indexdef:
+        return False
+    if kind == "hnsw":
+        return f"m='{settings.chat_hnsw_m}'" in indexdef and f"ef_construction='{settings.chat_hnsw_ef_construction}'" in indexdef
+    # Auto-sized lists drift with the row count; only an explicit CHAT_IVFFLAT_LISTS forces a rebuild
+    return settings.chat_ivfflat_lists <= 0 or f"lists='{settings.chat_ivfflat_lists}'" in indexdef
+
+
+def ensure_vector_index(
+    engine,
+    *,
+    rebuild: bool = False,
+    concurrently: bool = False,
+    max_rows: Optional[int] = None,
+    table: str = TABLE,
+    name: str = INDEX_NAME,
+) -> str:
+    """
+    Create (or, when its kind/parameters changed or rebuild is set, recreate) the ANN index.
+    With max_rows, tables with more embedded rows are skipped so startup is never held up by a
+    long index build. Returns a short description of what was done.
+    """
+    kind = settings.chat_ann_index.lower()
+    if kind == "none":
+        return "disabled (CHAT_ANN_INDEX=none)"
+    # CONCURRENTLY cannot run inside a transaction block
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        existing = conn.execute(
+            text("SELECT indexdef FROM pg_indexes WHERE tablename = :t AND indexname = :n"), {"t": table, "n": name}
+        ).scalar()
+        if existing and not rebuild and _matches(existing, kind):
+            return "up to date"
+        rows = int(conn.execute(text("SELECT count(*) FROM %s WHERE embedding IS NOT NULL" % table)).scalar() or 0)
+        if max_rows is not None and rows > max_rows:
+            logger.warning(
+                "%s: %s has %d embedded rows; not building %s index at startup. Run: python maintenance.py vector-index",
+                name, table, rows, kind,
+            )
+            return "skipped"
+        how = "CONCURRENTLY " if concurrently else ""
+        conn.execute(text(f"SET maintenance_work_mem = '{settings.chat_ann_maintenance_work_mem}'"))
+        if existing:
+            # Build the replacement first so searches keep an index until the swap
+            tmp = f"{name}_new"
+            conn.execute(text(f"DROP INDEX {how}IF EXISTS {tmp}"))
+            conn.execute(text(index_sql(kind, rows, table=table, name=tmp, concurrently=concurrently)))
+            conn.execute(text(f"DROP INDEX {how}IF EXISTS {name}"))
+            conn.execute(text(f"ALTER INDEX {tmp} RENAME TO {name}"))
+        else:
+            conn.execute(text(index_sql(kind, rows, table=table, name=name, concurrently=concurrently)))
+        conn.execute(text(f"ANALYZE {table}"))
+    return f"{'rebuilt' if existing else 'created'} {kind} index over {rows} rows"
+
+
+def _settings_for(version: tuple) -> List[str]:
+    stmts = [f"SET LOCAL ivfflat.probes = {int(settings.chat_ivfflat_probes)}"]
+    if version >= (0, 5, 0):
+        stmts.append(f"SET LOCAL hnsw.ef_search = {int(settings.chat_hnsw_ef_search)}")
+    # pgvector 0.8+: keep scanning the index until enough rows pass the user_id filter
+    # (older versions post-filter ef_search/probes candidates and can return too few rows)
+    if version >= (0, 8, 0) and settings.chat_ann_iterative_scan != "off":
+        stmts.append(f"SET LOCAL hnsw.iterative_scan = {settings.chat_ann_iterative_scan}")
+        stmts.append(f"SET LOCAL ivfflat.iterative_scan = {settings.chat_ann_iterative_scan}")
+    return stmts
+
+
+async def apply_search_settings(db: AsyncSession) -> None:
+    """SET LOCAL ef_search / probes / iterative scan for the current transaction before an ANN query."""
+    global _pgvector_version
+    if settings.chat_ann_index.lower() == "none":
+        return
+    if _pgvector_version is None:
+        _pgvector_version = _parse_version(
+            await db.scalar(text("SELECT extversion FROM pg_extension WHERE extname = 'vector'"))
+        )
+    for stmt in _settings_for(_pgvector_version):
+        await db.execute(text(stmt))
@@ -1,5 +1,6 @@
 import { createContext, useContext, useState, useCallback, type ReactNode } from "react";
 
+import { logout as revokeToken } from "../services/api";
 import type { AuthResponse, AuthState, Role } from "../types";
 
 export const AUTH_STORAGE_KEY = "health_analytics_auth";
@@ -45,6 +46,8 @@ export function AuthProvider({ children }: { children: ReactNode }) {
   }, []);
 
   const logout = useCallback(() => {
+    // Best effort: the token is read before storage is cleared below
+    revokeToken().catch(() => {});
     setAuth(null);
     saveAuth(null);
   }, []);
@@ -1,6 +1,13 @@
 import { fetchCheckIns } from "../services/api";
+import type { CheckInQuery } from "../services/api";
 import { useAsync } from "./useAsync";
 
-export function useCheckIns(patientId?: string) {
-  return useAsync(() => fetchCheckIns(patientId), [patientId ?? ""]);
+export function useCheckIns(patientId?: string, query: CheckInQuery = {}) {
+  return useAsync(() => fetchCheckIns(patientId, query), [
+    patientId ?? "",
+    query.since ?? "",
+    query.until ?? "",
+    query.limit ?? 0,
+    query.cursor ?? "",
+  ]);
 }
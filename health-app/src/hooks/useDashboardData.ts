@@ -1,18 +1,6 @@
-import type { Patient, CheckInWithScores } from "../types";
-import { fetchCheckIns, fetchPatients } from "../services/api";
+import { fetchDashboardAnalytics } from "../services/api";
 import { useAsync } from "./useAsync";
 
-interface DashboardData {
-  patients: Patient[];
-  checkIns: CheckInWithScores[];
-}
-
-function fetchDashboard(): Promise<DashboardData> {
-  return Promise.all([fetchPatients(), fetchCheckIns()]).then(
-    ([patients, checkIns]) => ({ patients, checkIns })
-  );
-}
-
-export function useDashboardData() {
-  return useAsync(fetchDashboard, []);
+export function useDashboardData(days: number = 30) {
+  return useAsync(() => fetchDashboardAnalytics(days), [days]);
 }
@@ -2,109 +2,36 @@ import { useMemo } from "react";
 import { useNavigate } from "react-router-dom";
 import { useAuth } from "../context/AuthContext";
 import { useDashboardData } from "../hooks";
-import { addDays, toISODate, formatDate } from "../utils";
+import { formatDate } from "../utils";
 import { AppLayout } from "../components/layout";
 import { KpiCard, LineChartCard, DataTable, StatusBadge, QueryState } from "../components";
 
-// API returns full ISO datetime; normalize to YYYY-MM-DD for comparisons and grouping
-const toDateOnly = (d: string) => (d && d.length >= 10 ? d.slice(0, 10) : d);
-
 export function AdminDashboardPage() {
   const { user } = useAuth();
   const navigate = useNavigate();
-  const { data, loading, error } = useDashboardData();
-  const patients = data?.patients ?? [];
-  const checkIns = data?.checkIns ?? [];
-  const today = toISODate(new Date());
-
-  const last7 = useMemo(() => {
-    const start = addDays(today, -7);
-    return checkIns.filter((c) => {
-      const day = toDateOnly(c.date);
-      return day >= start && day <= today;
-    });
-  }, [checkIns, today]);
-  const last30 = useMemo(() => {
-    const start = addDays(today, -30);
-    return checkIns.filter((c) => {
-      const day = toDateOnly(c.date);
-      return day >= start && day <= today;
-    });
-  }, [checkIns, today]);
+  // KPIs, per-day series and latest check-in per patient are aggregated server-side
+  const { data, loading, error } = useDashboardData(30);
+  const perDay = data?.per_day ?? [];
 
-  const checkInsToday = checkIns.filter((c) => toDateOnly(c.date) === today).length;
-  const expectedPerDay = patients.length;
-  const missingRate7d =
-    expectedPerDay * 7 > 0
-      ? ((1 - last7.length / (expectedPerDay * 7)) * 100).toFixed(1) + "%"
-      : "0%";
-  const flagged7d = last7.filter((c) => c.status !== "Normal").length;
+  const checkInsToday = data?.check_ins_today ?? 0;
+  const missingRate7d = data ? data.missing_rate_7d.toFixed(1) + "%" : "0%";
+  const flagged7d = data?.flagged_7d ?? 0;
   const avgSymptom7d =
-    last7.length > 0
-      ? (last7.reduce((s, c) => s + c.symptom_score, 0) / last7.length).toFixed(1)
-      : "—";
-
-  const byDay = useMemo(() => {
-    const map = new Map<string, number>();
-    for (let i = 29; i >= 0; i--) map.set(addDays(today, -i), 0);
-    last30.forEach((c) => {
-      const day = toDateOnly(c.date);
-      map.set(day, (map.get(day) ?? 0) + 1);
-    });
-    return Array.from(map.entries()).map(([date, value]) => ({
-      date: date.slice(5),
-      value,
-    }));
-  }, [last30, today]);
+    data?.avg_symptom_score_7d != null ? data.avg_symptom_score_7d.toFixed(1) : "—";
 
-  const riskByDay = useMemo(() => {
-    const map = new Map<string, { sum: number; count: number }>();
-    for (let i = 29; i >= 0; i--) map.set(addDays(today, -i), { sum: 0, count: 0 });
-    last30.forEach((c) => {
-      const day = toDateOnly(c.date);
-      const v = map.get(day)!;
-      v.sum += c.risk_score;
-      v.count += 1;
-    });
-    return Array.from(map.entries()).map(([date, v]) => ({
-      date: date.slice(5),
-      value: v.count ? Math.round((v.sum / v.count) * 10) / 10 : 0,
-    }));
-  }, [last30, today]);
-
-  // One row per patient: their latest check-in. Sort so Needs Follow-up / Escalated first, then by risk desc.
-  const needsFollowUp = useMemo(() => {
-    const byPatient = new Map<string, (typeof checkIns)[0]>();
-    checkIns.forEach((c) => {
-      const cur = byPatient.get(c.patient_id);
-      if (!cur || c.date > cur.date) byPatient.set(c.patient_id, c);
-    });
-    const list = Array.from(byPatient.values());
-    const statusOrder = (s: string) => (s === "Escalated" ? 0 : s === "Needs Follow-up" ? 1 : 2);
-    return list.sort((a, b) => {
-      const orderA = statusOrder(a.status);
-      const orderB = statusOrder(b.status);
-      if (orderA !== orderB) return orderA - orderB;
-      return b.risk_score - a.risk_score;
-    });
-  }, [checkIns]);
+  const byDay = useMemo(
+    () => perDay.map((d) => ({ date: d.date.slice(5), value: d.count })),
+    [perDay]
+  );
 
-  // If no check-ins yet, show one row per patient with placeholder so table isn’t empty
-  const tableRows = useMemo(() => {
-    if (needsFollowUp.length > 0) return needsFollowUp;
-    return patients.map((p) => ({
-      id: p.id,
-      patient_id: p.id,
-      date: "",
-      risk_score: 0,
-      status: "Normal" as const,
-      symptom_score: 0,
-    })) as (typeof checkIns)[0][];
-  }, [needsFollowUp, patients]);
+  const riskByDay = useMemo(
+    () => perDay.map((d) => ({ date: d.date.slice(5), value: d.avg_risk_score })),
+    [perDay]
+  );
 
-  const getPatientName = (id: string) => patients.find((p) => p.id === id)?.name ?? id;
-  const getPatientCondition = (id: string) =>
-    patients.find((p) => p.id === id)?.condition ?? "—";
+  // One row per patient: their latest check-in, Escalated / Needs Follow-up first, then by risk desc.
+  // Patients without a check-in come last with placeholder values.
+  const tableRows = data?.latest ?? [];
 
   return (
     <AppLayout role="admin" email={user?.email ?? ""} pageTitle="Dashboard">
@@ -142,21 +69,21 @@ export function AdminDashboardPage() {
               Needs Follow-up
             </h2>
             <p className="mb-3 text-sm text-slate-500">
-              Patients needing follow-up appear first. All patients with a check-in are listed.
+              Patients needing follow-up appear first. All patients are listed.
             </p>
             <DataTable
-              keyField="id"
+              keyField="patient_id"
               data={tableRows}
               columns={[
                 {
                   key: "patient",
                   header: "Patient",
-                  render: (r) => getPatientName(r.patient_id),
+                  render: (r) => r.patient_name,
                 },
                 {
                   key: "condition",
                   header: "Condition",
-                  render: (r) => getPatientCondition(r.patient_id),
+                  render: (r) => r.condition || "—",
                 },
                 {
                   key: "date",
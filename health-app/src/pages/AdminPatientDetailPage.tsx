@@ -12,12 +12,15 @@ import {
   QueryState,
 } from "../components";
 
+// Most recent check-ins shown in the trend chart and table
+const RECENT_CHECK_INS = 90;
+
 export function AdminPatientDetailPage() {
   const { user } = useAuth();
   const { id } = useParams<{ id: string }>();
   const [followUpOpen, setFollowUpOpen] = useState(false);
   const patientState = usePatient(id);
-  const checkInsState = useCheckIns(id ?? "");
+  const checkInsState = useCheckIns(id ?? "", { limit: RECENT_CHECK_INS });
   const patient = patientState.data ?? undefined;
   const checkIns = checkInsState.data ?? [];
   const loading = patientState.loading || checkInsState.loading;
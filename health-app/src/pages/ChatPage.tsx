@@ -1,7 +1,7 @@
 import { useState } from 'react';
 import { useAuth } from '../context/AuthContext';
 import { AppLayout } from '../components/layout';
-import { sendChatMessage } from '../services/api';
+import { streamChatMessage } from '../services/api';
 import type { ChatMessage } from '../types';
 
 type MessageRole = 'user' | 'assistant';
@@ -42,6 +42,7 @@ export function ChatPage() {
     setInput('');
     setLoading(true);
     setError(null);
+    const assistantId = (Date.now() + 1).toString();
 
     try {
       // Convert messages to ChatMessage format for API
@@ -52,25 +53,29 @@ export function ChatPage() {
           content: msg.content,
         }));
 
-      const response = await sendChatMessage(text, conversationHistory);
-      
-      const assistantMsg: Message = {
-        id: (Date.now() + 1).toString(),
-        role: 'assistant',
-        content: response.response,
-        timestamp: new Date(),
-      };
-      setMessages((prev) => [...prev, assistantMsg]);
+      // Show the reply as it streams in: start with an empty message and append tokens
+      setMessages((prev) => [
+        ...prev,
+        { id: assistantId, role: 'assistant', content: '', timestamp: new Date() },
+      ]);
+      await streamChatMessage(text, conversationHistory, (chunk) => {
+        setMessages((prev) =>
+          prev.map((m) => (m.id === assistantId ? { ...m, content: m.content + chunk } : m))
+        );
+      });
     } catch (e) {
       const errorMsg = e instanceof Error ? e.message : 'Failed to get response';
       setError(errorMsg);
       const errorAssistantMsg: Message = {
-        id: (Date.now() + 1).toString(),
+        id: `${assistantId}-error`,
         role: 'assistant',
         content: `Sorry, I encountered an error: ${errorMsg}`,
         timestamp: new Date(),
       };
-      setMessages((prev) => [...prev, errorAssistantMsg]);
+      setMessages((prev) => [
+        ...prev.filter((m) => !(m.id === assistantId && m.content === '')),
+        errorAssistantMsg,
+      ]);
     } finally {
       setLoading(false);
     }
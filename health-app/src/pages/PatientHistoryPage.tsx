@@ -23,8 +23,18 @@ export function PatientHistoryPage() {
   const [customEnd, setCustomEnd] = useState("");
   const [selected, setSelected] = useState<CheckInWithScores | null>(null);
   const [drawerOpen, setDrawerOpen] = useState(false);
-  const { data, loading, error, refetch } = useCheckIns(user?.id ?? "p1");
-  const allCheckIns = data ?? [];
+  const { start, end } = useMemo(() => {
+    const today = toISODate(new Date());
+    if (range === "7") return { start: addDays(today, -7), end: today };
+    if (range === "30") return { start: addDays(today, -30), end: today };
+    return { start: customStart || addDays(today, -30), end: customEnd || today };
+  }, [range, customStart, customEnd]);
+  // Only the displayed window is fetched; the API filters by date (inclusive)
+  const { data, loading, error, refetch } = useCheckIns(user?.id ?? "p1", {
+    since: start,
+    until: end,
+  });
+  const filtered = data ?? [];
   const prevPathRef = useRef(location.pathname);
 
   // Refetch when user navigates to this page so new check-ins appear (e.g. after submitting)
@@ -35,24 +45,6 @@ export function PatientHistoryPage() {
     if (isNavigatingToHistory) refetch();
   }, [location.pathname, refetch]);
 
-  const filtered = useMemo(() => {
-    const today = toISODate(new Date());
-    let start: string;
-    let end: string = today;
-    if (range === "7") start = addDays(today, -7);
-    else if (range === "30") start = addDays(today, -30);
-    else {
-      start = customStart || addDays(today, -30);
-      end = customEnd || today;
-    }
-    // API returns full ISO datetime; compare date part only (YYYY-MM-DD)
-    const toDateOnly = (d: string) => (d && d.length >= 10 ? d.slice(0, 10) : d);
-    return allCheckIns.filter((c) => {
-      const day = toDateOnly(c.date);
-      return day >= start && day <= end;
-    });
-  }, [allCheckIns, range, customStart, customEnd]);
-
   const openDrawer = (row: CheckInWithScores) => {
     setSelected(row);
     setDrawerOpen(true);
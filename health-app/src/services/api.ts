@@ -7,12 +7,15 @@ import type {
   ChatRequest,
   ChatResponse,
   ChatMessage,
+  DashboardAnalytics,
 } from "../types";
-import { ApiError, request } from "./client";
+import { config } from "../config";
+import { ApiError, getStoredToken, parseErrorResponse, request } from "./client";
 
 const PATIENTS = "/patients";
 const CHECK_INS = "/check-ins";
 const CHAT = "/chat";
+const ANALYTICS = "/analytics";
 
 export async function register(user: {
   email: string;
@@ -45,6 +48,11 @@ export async function login(
   );
 }
 
+/** POST /auth/logout: revoke the current token server-side. */
+export async function logout(): Promise<void> {
+  await request<void>("/auth/logout", { method: "POST" });
+}
+
 export async function getCurrentUser(): Promise<AuthState["user"]> {
   return request<AuthState["user"]>("/auth/me");
 }
@@ -62,14 +70,35 @@ export async function fetchPatient(id: string): Promise<Patient | null> {
   }
 }
 
+/** Server-side window for GET /check-ins (since/until are inclusive ISO dates) */
+export interface CheckInQuery {
+  since?: string;
+  until?: string;
+  limit?: number;
+  cursor?: string;
+}
+
 export async function fetchCheckIns(
-  patientId?: string
+  patientId?: string,
+  query: CheckInQuery = {}
 ): Promise<CheckInWithScores[]> {
-  const q = patientId ? `?patient_id=${encodeURIComponent(patientId)}` : "";
+  const params = new URLSearchParams();
+  if (patientId) params.set("patient_id", patientId);
+  if (query.since) params.set("since", query.since);
+  if (query.until) params.set("until", query.until);
+  if (query.limit != null) params.set("limit", String(query.limit));
+  if (query.cursor) params.set("cursor", query.cursor);
+  const q = params.toString() ? `?${params.toString()}` : "";
   const list = await request<CheckInWithScores[]>(`${CHECK_INS}${q}`);
   return Array.isArray(list) ? list : [];
 }
 
+export async function fetchDashboardAnalytics(
+  days: number = 30
+): Promise<DashboardAnalytics> {
+  return request<DashboardAnalytics>(`${ANALYTICS}/dashboard?days=${days}`);
+}
+
 export async function createCheckIn(
   body: Omit<CheckIn, "id">
 ): Promise<CheckInWithScores> {
@@ -122,3 +151,58 @@ export async function sendChatMessage(
     body: JSON.stringify(payload),
   });
 }
+
+/**
+ * POST /chat/stream: calls onToken for each chunk as the model generates it
+ * (Server-Sent Events). Resolves once the reply has been stored.
+ */
+export async function streamChatMessage(
+  message: string,
+  conversationHistory: ChatMessage[] | undefined,
+  onToken: (text: string) => void
+): Promise<{ provider: ChatResponse["provider"]; cached: boolean }> {
+  const payload: ChatRequest = {
+    message,
+    conversation_history: conversationHistory,
+  };
+  const token = getStoredToken();
+  const res = await fetch(`${config.apiBaseUrl}${CHAT}/stream`, {
+    method: "POST",
+    headers: {
+      "Content-Type": "application/json",
+      Accept: "text/event-stream",
+      ...(token ? { Authorization: `Bearer ${token}` } : {}),
+    },
+    body: JSON.stringify(payload),
+  });
+  if (!res.ok || !res.body) {
+    throw new ApiError(await parseErrorResponse(res), res.status);
+  }
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let provider: ChatResponse["provider"] = "ollama";
+  let cached = false;
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let sep: number;
+    while ((sep = buffer.indexOf("\n\n")) >= 0) {
+      const raw = buffer.slice(0, sep);
+      buffer = buffer.slice(sep + 2);
+      const event = raw.match(/^event: (.*)$/m)?.[1];
+      const data = raw.match(/^data: (.*)$/m)?.[1];
+      if (!event || data === undefined) continue;
+      const parsed = JSON.parse(data);
+      if (event === "token") onToken(parsed.text);
+      else if (event === "done") {
+        provider = parsed.provider;
+        cached = Boolean(parsed.cached);
+      }
+      else if (event === "error") throw new ApiError(parsed.detail, 500);
+    }
+  }
+  return { provider, cached };
+}
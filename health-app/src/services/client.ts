@@ -12,7 +12,20 @@ export class ApiError extends Error {
   }
 }
 
-async function parseErrorResponse(res: Response): Promise<string> {
+export function getStoredToken(): string | undefined {
+  try {
+    const raw = localStorage.getItem(AUTH_STORAGE_KEY);
+    if (raw) {
+      const parsed = JSON.parse(raw) as { token?: { access_token?: string } };
+      return parsed?.token?.access_token;
+    }
+  } catch {
+    // ignore
+  }
+  return undefined;
+}
+
+export async function parseErrorResponse(res: Response): Promise<string> {
   const text = await res.text();
   try {
     const j = JSON.parse(text) as { detail?: string };
@@ -35,18 +48,7 @@ export async function request<T>(
   if (import.meta.env.DEV) {
     console.log(`[API] ${options.method || "GET"} ${url}`);
   }
-  let token: string | undefined;
-  if (auth) {
-    try {
-      const raw = localStorage.getItem(AUTH_STORAGE_KEY);
-      if (raw) {
-        const parsed = JSON.parse(raw) as { token?: { access_token?: string } };
-        token = parsed?.token?.access_token;
-      }
-    } catch {
-      // ignore
-    }
-  }
+  const token = auth ? getStoredToken() : undefined;
   const res = await fetch(url, {
     ...options,
     headers: {
@@ -89,4 +89,40 @@ export interface ChatRequest {
 export interface ChatResponse {
   response: string;
   provider: 'ollama' | 'vertex';
+  /** true when the answer was reused from the server's semantic answer cache */
+  cached?: boolean;
+  /** estimated prompt size sent to the model (absent when cached) */
+  prompt_tokens?: number | null;
+}
+
+/** GET /analytics/dashboard — aggregates computed server-side */
+export interface DashboardDay {
+  date: string;
+  count: number;
+  avg_risk_score: number;
+}
+
+export interface DashboardLatest {
+  patient_id: string;
+  patient_name: string;
+  condition: string;
+  check_in_id: string | null;
+  date: string | null;
+  symptom_score: number | null;
+  risk_score: number | null;
+  status: Status;
+}
+
+export interface DashboardAnalytics {
+  days: number;
+  today: string;
+  patient_count: number;
+  check_ins_today: number;
+  check_ins_7d: number;
+  check_ins_window: number;
+  missing_rate_7d: number;
+  flagged_7d: number;
+  avg_symptom_score_7d: number | null;
+  per_day: DashboardDay[];
+  latest: DashboardLatest[];
 }